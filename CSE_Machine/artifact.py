@@ -0,0 +1,271 @@
+import mmap
+import struct
+from .nodes import *
+from .defaults import ARTIFACT_MAGIC as MAGIC, is_artifact
+
+# Compiled program files (.rpalc) hold the control structures built by
+# CSEMachineFactory. Layout, all integers little-endian u32:
+#
+#   header   MAGIC, VERSION, string count, block count, root block
+#   strings  (offset, length) per string, then the UTF-8 bytes
+#   blocks   (offset, length) per block, then the encoded symbols
+#
+# A block is the symbol list of a Delta or of a B. Blocks 0..n-1 are the
+# Deltas by index, B blocks follow. Each symbol is an opcode byte followed
+# by its u32 operands. The loader memory-maps the file and decodes a block
+# only when its symbols are first used.
+
+VERSION = 1
+HEADER = struct.Struct("<6sIIII")
+ENTRY = struct.Struct("<II")
+U32 = struct.Struct("<I")
+
+OP_ID, OP_INT, OP_STR, OP_TRUE, OP_FALSE, OP_NIL, OP_DUMMY, OP_UOP, OP_BOP, \
+    OP_GAMMA, OP_TAU, OP_YSTAR, OP_LAMBDA, OP_DELTA, OP_BETA, OP_B, OP_ERR = range(17)
+
+SIMPLE_OPCODES = {Gamma: OP_GAMMA, Ystar: OP_YSTAR, Beta: OP_BETA, Dummy: OP_DUMMY, Err: OP_ERR}
+STRING_OPCODES = {Id: OP_ID, Int: OP_INT, Str: OP_STR, Uop: OP_UOP, Bop: OP_BOP}
+
+
+class ArtifactWriter:
+    """Encodes the control structures reachable from a root Delta."""
+
+    def __init__(self):
+        self.strings = {}
+        self.numbers = {}
+
+    def get_string(self, data):
+        if data not in self.strings:
+            self.strings[data] = len(self.strings)
+        return self.strings[data]
+
+    def number_blocks(self, root):
+        # Deltas keep their index, B blocks are numbered after all Deltas
+        blocks = []
+        seen = {id(root)}
+        pending = [root]
+        while pending:
+            block = pending.pop()
+            blocks.append(block)
+            for symbol in block.symbols:
+                child = symbol.get_delta() if isinstance(symbol, Lambda) else symbol
+                if isinstance(child, (Delta, B)) and id(child) not in seen:
+                    seen.add(id(child))
+                    pending.append(child)
+        deltas = [block for block in blocks if isinstance(block, Delta)]
+        count = max(delta.get_index() for delta in deltas) + 1
+        for block in blocks:
+            if isinstance(block, Delta):
+                self.numbers[id(block)] = block.get_index()
+            else:
+                self.numbers[id(block)] = count
+                count += 1
+        return blocks, count
+
+    def encode_symbols(self, symbols):
+        out = []
+        for symbol in symbols:
+            t = type(symbol)
+            if t in STRING_OPCODES:
+                out.append(struct.pack("<BI", STRING_OPCODES[t], self.get_string(symbol.get_data())))
+            elif t in SIMPLE_OPCODES:
+                out.append(struct.pack("<B", SIMPLE_OPCODES[t]))
+            elif t is Bool:
+                out.append(struct.pack("<B", OP_TRUE if symbol.get_data() == "true" else OP_FALSE))
+            elif t is Tup:
+                out.append(struct.pack("<B", OP_NIL))
+            elif t is Tau:
+                out.append(struct.pack("<BI", OP_TAU, symbol.get_n()))
+            elif t is Delta:
+                out.append(struct.pack("<BI", OP_DELTA, self.numbers[id(symbol)]))
+            elif t is B:
+                out.append(struct.pack("<BI", OP_B, self.numbers[id(symbol)]))
+            elif t is Lambda:
+                identifiers = [self.get_string(id.get_data()) for id in symbol.identifiers]
+                out.append(struct.pack(f"<BIII{len(identifiers)}I", OP_LAMBDA, symbol.get_index(),
+                                       self.numbers[id(symbol.get_delta())], len(identifiers), *identifiers))
+            else:
+                raise ValueError(f"Cannot compile symbol '{symbol.get_data()}'")
+        return b"".join(out)
+
+    def write(self, path, root):
+        blocks, count = self.number_blocks(root)
+        bodies = [b""] * count
+        for block in blocks:
+            bodies[self.numbers[id(block)]] = self.encode_symbols(block.symbols)
+        strings = [s.encode("utf-8") for s in sorted(self.strings, key=self.strings.get)]
+        with open(path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, len(strings), count, self.numbers[id(root)]))
+            self.write_table(file, strings)
+            self.write_table(file, bodies)
+
+    def write_table(self, file, items):
+        offset = 0
+        for item in items:
+            file.write(ENTRY.pack(offset, len(item)))
+            offset += len(item)
+        for item in items:
+            file.write(item)
+
+
+class LazyDelta(Delta):
+    """A Delta whose symbols are decoded from the artifact on first use."""
+
+    def __init__(self, i, artifact, block):
+        Symbol.__init__(self, "delta")
+        self.index = i
+        self.artifact = artifact
+        self.block = block
+        self._symbols = None
+
+    @property
+    def symbols(self):
+        if self._symbols is None:
+            self._symbols = self.artifact.decode_block(self.block)
+        return self._symbols
+
+    @symbols.setter
+    def symbols(self, symbols):
+        self._symbols = symbols
+
+    def __reduce__(self):
+        # Pickled, e.g. in a checkpoint, as a plain Delta without the file
+        return Delta, (self.index,), {"data": self.data, "index": self.index, "symbols": self.symbols}
+
+
+class LazyB(B):
+    """A B whose symbols are decoded from the artifact on first use."""
+
+    def __init__(self, artifact, block):
+        Symbol.__init__(self, "b")
+        self.artifact = artifact
+        self.block = block
+        self._symbols = None
+
+    @property
+    def symbols(self):
+        if self._symbols is None:
+            self._symbols = self.artifact.decode_block(self.block)
+        return self._symbols
+
+    @symbols.setter
+    def symbols(self, symbols):
+        self._symbols = symbols
+
+    def __reduce__(self):
+        return B, (), {"data": self.data, "symbols": self.symbols}
+
+
+class Artifact:
+    """A memory-mapped compiled program."""
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.string_count, self.block_count, self.root = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"'{path}' is not a compiled RPAL program")
+        if version != VERSION:
+            raise ValueError(f"'{path}' has format version {version}, expected {VERSION}")
+        self.strings_table = HEADER.size
+        self.strings_data = self.strings_table + ENTRY.size * self.string_count
+        size = 0
+        if self.string_count:
+            offset, length = ENTRY.unpack_from(self.data, self.strings_table + ENTRY.size * (self.string_count - 1))
+            size = offset + length
+        self.blocks_table = self.strings_data + size
+        self.blocks_data = self.blocks_table + ENTRY.size * self.block_count
+        self.strings = {}
+        self.blocks = {}
+
+    def get_string(self, i):
+        if i not in self.strings:
+            offset, length = ENTRY.unpack_from(self.data, self.strings_table + ENTRY.size * i)
+            start = self.strings_data + offset
+            self.strings[i] = self.data[start:start + length].decode("utf-8")
+        return self.strings[i]
+
+    def get_delta(self, i):
+        # One shared object per block, as in the control structures built by the factory
+        if i not in self.blocks:
+            self.blocks[i] = LazyDelta(i, self, i)
+        return self.blocks[i]
+
+    def get_b(self, i):
+        if i not in self.blocks:
+            self.blocks[i] = LazyB(self, i)
+        return self.blocks[i]
+
+    def get_root(self):
+        return self.get_delta(self.root)
+
+    def decode_block(self, i):
+        offset, length = ENTRY.unpack_from(self.data, self.blocks_table + ENTRY.size * i)
+        position = self.blocks_data + offset
+        end = position + length
+        data = self.data
+        symbols = []
+        while position < end:
+            opcode = data[position]
+            position += 1
+            if opcode in (OP_ID, OP_INT, OP_STR, OP_UOP, OP_BOP):
+                s = self.get_string(U32.unpack_from(data, position)[0])
+                position += 4
+                symbols.append({OP_ID: Id, OP_INT: Int, OP_STR: Str, OP_UOP: Uop, OP_BOP: Bop}[opcode](s))
+            elif opcode == OP_GAMMA:
+                symbols.append(Gamma())
+            elif opcode == OP_TAU:
+                symbols.append(Tau(U32.unpack_from(data, position)[0]))
+                position += 4
+            elif opcode == OP_LAMBDA:
+                index, block, n = struct.unpack_from("<III", data, position)
+                identifiers = struct.unpack_from(f"<{n}I", data, position + 12)
+                position += 12 + 4 * n
+                lambda_expr = Lambda(index)
+                lambda_expr.set_delta(self.get_delta(block))
+                lambda_expr.identifiers = [Id(self.get_string(s)) for s in identifiers]
+                symbols.append(lambda_expr)
+            elif opcode == OP_DELTA:
+                symbols.append(self.get_delta(U32.unpack_from(data, position)[0]))
+                position += 4
+            elif opcode == OP_B:
+                symbols.append(self.get_b(U32.unpack_from(data, position)[0]))
+                position += 4
+            elif opcode == OP_TRUE:
+                symbols.append(Bool("true"))
+            elif opcode == OP_FALSE:
+                symbols.append(Bool("false"))
+            elif opcode == OP_NIL:
+                symbols.append(Tup())
+            elif opcode == OP_DUMMY:
+                symbols.append(Dummy())
+            elif opcode == OP_YSTAR:
+                symbols.append(Ystar())
+            elif opcode == OP_BETA:
+                symbols.append(Beta())
+            elif opcode == OP_ERR:
+                symbols.append(Err())
+            else:
+                raise ValueError(f"Unknown opcode {opcode} in compiled program")
+        return symbols
+
+
+def write_artifact(path, ast, factory=None):
+    """Compile a standardized AST and write its control structures to path.
+
+    factory builds the control structures, a StandardizingFactory for an AST
+    that is not standardized.
+    """
+    from .cse_factory import CSEMachineFactory
+    if factory is None:
+        factory = CSEMachineFactory()
+    root = factory.get_delta(ast.get_root())
+    ArtifactWriter().write(path, root)
+
+def load_cse_machine(path, builtins=None, output=None, memo=None):
+    """Return a CSE machine ready to run the compiled program at path."""
+    from .csemachine import CSEMachine
+    from .cse_factory import CSEMachineFactory
+    factory = CSEMachineFactory()
+    control = [factory.e0, Artifact(path).get_root()]
+    return CSEMachine(control, factory.get_stack(), factory.get_environment(), builtins, output, memo)
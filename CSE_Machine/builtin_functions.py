@@ -0,0 +1,112 @@
+from functools import partial
+from .nodes import *
+
+class BuiltinRegistry:
+    """Maps the names of RPAL built-in functions to native implementations.
+
+    An implementation is called as function(machine, rand) with the CSE
+    machine and the argument symbol, and returns the result symbol. Functions
+    of several arguments return a Builtin that takes the next argument.
+    Host code can add its own functions, e.g. numeric helpers over tuples:
+
+        registry = BUILTINS.copy()
+
+        @registry.register("Sum")
+        def rpal_sum(machine, tup):
+            values = tup.get_values()  # the array of a tuple of integers
+            if values is None:
+                values = [int(s.get_data()) for s in tup.get_symbols()]
+            return Int(str(sum(values)))
+
+        CSEMachineFactory().get_cse_machine(ast, builtins=registry)
+    """
+
+    def __init__(self, functions=None):
+        self.functions = dict(functions or {})
+
+    def register(self, name, function=None):
+        """Register function under name; usable as a decorator."""
+        if function is None:
+            def decorator(function):
+                self.functions[name] = function
+                return function
+            return decorator
+        self.functions[name] = function
+        return function
+
+    def get(self, name):
+        """Return the implementation registered under name, or None."""
+        return self.functions.get(name)
+
+    def copy(self):
+        """Return a new registry with the same functions, to extend separately."""
+        return BuiltinRegistry(self.functions)
+
+
+BUILTINS = BuiltinRegistry()
+
+
+def get_bool(value):
+    return Bool("true" if value else "false")
+
+
+@BUILTINS.register("Print")
+def rpal_print(machine, rand):
+    machine.write_value(rand)
+    return Dummy()
+
+@BUILTINS.register("Stem")
+def rpal_stem(machine, s):
+    return s.stem()
+
+@BUILTINS.register("Stern")
+def rpal_stern(machine, s):
+    return s.stern()
+
+@BUILTINS.register("Conc")
+def rpal_conc(machine, s1):
+    # A partial of a module function, so the value can be pickled in a checkpoint
+    return Builtin("Conc", partial(rpal_conc_second, s1))
+
+def rpal_conc_second(s1, machine, s2):
+    return s1.concat(s2)
+
+@BUILTINS.register("Order")
+def rpal_order(machine, tup):
+    return Int(str(tup.get_n()))
+
+@BUILTINS.register("Null")
+def rpal_null(machine, rand):
+    return get_bool(isinstance(rand, Tup) and rand.get_n() == 0)
+
+@BUILTINS.register("ItoS")
+@BUILTINS.register("Itos")
+def rpal_itos(machine, rand):
+    return Str(rand.get_data())
+
+@BUILTINS.register("Isinteger")
+def rpal_isinteger(machine, rand):
+    return get_bool(isinstance(rand, Int))
+
+@BUILTINS.register("Isstring")
+def rpal_isstring(machine, rand):
+    return get_bool(isinstance(rand, Str))
+
+@BUILTINS.register("Istuple")
+def rpal_istuple(machine, rand):
+    return get_bool(isinstance(rand, Tup))
+
+@BUILTINS.register("Isdummy")
+def rpal_isdummy(machine, rand):
+    return get_bool(isinstance(rand, Dummy))
+
+@BUILTINS.register("Istruthvalue")
+def rpal_istruthvalue(machine, rand):
+    return get_bool(isinstance(rand, Bool))
+
+@BUILTINS.register("Isfunction")
+def rpal_isfunction(machine, rand):
+    if isinstance(rand, (Lambda, Eta, Builtin)):
+        return get_bool(True)
+    # Built-ins are bound to plain Symbols carrying their name
+    return get_bool(type(rand) is Symbol and machine.builtins.get(rand.get_data()) is not None)
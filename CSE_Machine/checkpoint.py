@@ -0,0 +1,123 @@
+import os
+import struct
+import sys
+from array import array
+
+# Checkpoint files hold the state of a running CSE machine: MAGIC, VERSION
+# as a little-endian u32, then the zlib-compressed pickle of the state. The
+# pickle keeps the sharing of Lambda, Delta and E objects, so closures and
+# environment frames are restored as one graph.
+#
+# Loading a checkpoint unpickles it, which can run arbitrary code: only
+# load checkpoints you wrote yourself. The machine's environment list only
+# grows, so environments nothing refers to any more are saved as one
+# placeholder; the file still grows with the number of live environments.
+
+MAGIC = b"RPALS\0"
+VERSION = 1
+HEADER = struct.Struct("<6sI")
+
+# Nested tuples and environment chains are pickled recursively
+PICKLE_RECURSION_LIMIT = 100000
+
+STATE = ("control", "stack", "environment", "current_environment", "has_output", "writes",
+         "memo", "pending_results", "workers")
+
+def get_live_environments(machine):
+    """Return the set of the indices of the environments the machine can reach.
+
+    Environments are reached from the control, the stack, the current
+    environment and the memo cache, then through parents, bound values,
+    closures and the arguments of partially applied built-ins.
+    """
+    from functools import partial
+    from .nodes import E, Lambda, Eta, Tup, Builtin
+    environment = machine.environment
+    live = set()
+    seen = set()
+    pending = list(machine.control) + list(machine.stack) + [machine.current_environment, environment[0]]
+    if machine.memo is not None:
+        pending.extend(machine.memo.results.values())
+    while pending:
+        symbol = pending.pop()
+        if id(symbol) in seen:
+            continue
+        seen.add(id(symbol))
+        t = type(symbol)
+        if t is E:
+            live.add(symbol.get_index())
+            pending.extend(symbol.values.values())
+            if symbol.get_parent() is not None:
+                pending.append(symbol.get_parent())
+        elif t is Lambda and symbol.get_environment() is not None:
+            pending.append(environment[symbol.get_environment()])
+        elif t is Eta:
+            pending.append(environment[symbol.get_environment()])
+            pending.append(symbol.get_lambda())
+        elif t is Tup and type(symbol.symbols) is not array:
+            pending.extend(symbol.get_symbols())
+        elif t is Builtin and type(symbol.function) is partial:
+            pending.extend(symbol.function.args)
+            pending.extend(symbol.function.keywords.values())
+    return live
+
+def get_pruned_environments(machine):
+    # The environment list, with the environments nothing reaches replaced
+    # by one removed placeholder; indices still match list positions
+    from .nodes import E
+    live = get_live_environments(machine)
+    placeholder = E(-1)
+    placeholder.set_is_removed(True)
+    return [e if i in live else placeholder for i, e in enumerate(machine.environment)]
+
+def save_checkpoint(machine, path):
+    """Write the state of machine to path, replacing the file atomically.
+
+    The output and built-in functions are not saved; output written so far
+    is flushed, so the checkpoint resumes right after it.
+    """
+    import pickle
+    import zlib
+    state = {name: getattr(machine, name) for name in STATE}
+    state["environment"] = get_pruned_environments(machine)
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, PICKLE_RECURSION_LIMIT))
+    try:
+        data = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, AttributeError, TypeError) as e:
+        raise ValueError(f"Cannot checkpoint the machine: {e}")
+    finally:
+        sys.setrecursionlimit(limit)
+    if hasattr(machine.output, "flush"):
+        machine.output.flush()
+    temp = path + ".tmp"
+    with open(temp, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION))
+        file.write(zlib.compress(data, 1))
+    os.replace(temp, path)
+
+def load_checkpoint(path, builtins=None, output=None):
+    """Return a CSE machine that resumes from the checkpoint at path.
+
+    The file is unpickled, so it must come from a trusted source.
+    """
+    import pickle
+    import zlib
+    from .csemachine import CSEMachine
+    with open(path, "rb") as file:
+        data = file.read()
+    magic, version = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"'{path}' is not a checkpoint")
+    if version != VERSION:
+        raise ValueError(f"'{path}' has checkpoint version {version}, expected {VERSION}")
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, PICKLE_RECURSION_LIMIT))
+    try:
+        state = pickle.loads(zlib.decompress(data[HEADER.size:]))
+    finally:
+        sys.setrecursionlimit(limit)
+    machine = CSEMachine(state["control"], state["stack"], state["environment"], builtins, output)
+    for name in STATE:
+        setattr(machine, name, state[name])
+    return machine
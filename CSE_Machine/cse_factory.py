@@ -1,11 +1,18 @@
 from .nodes import *
 from .csemachine import CSEMachine
+from .builtin_functions import BUILTINS
 
 class CSEMachineFactory:
-    def __init__(self):
+    def __init__(self, parallel=False):
         self.e0 = E(0)
         self.i = 1
         self.j = 0
+        # Build ParallelTau symbols for tuples with several expensive components
+        self.parallel = parallel
+        # Hash-consing tables: constant symbols by value, and Deltas and Bs
+        # by their (already shared) symbols
+        self.constants = {}
+        self.blocks = {}
 
     def get_symbol(self, node):
         data = node.get_data()
@@ -25,14 +32,14 @@ class CSEMachineFactory:
             elif data.startswith("<INTEGER:"):
                 return Int(data[9:-1])  # Integer symbol
             elif data.startswith("<STRING:"):
-                return Str(data[9:-2])  # String symbol
+                return Str(data, 9, len(data) - 2)  # String symbol, a view into the node data
             elif data.startswith("<NIL"):
                 return Tup()  # Tuple symbol
             elif data.startswith("<TRUE_VALUE:t"):
                 return Bool("true")  # Boolean true symbol
-            elif data.startswith("<TRUE_VALUE:f"):
+            elif data.startswith("<FALSE_VALUE:") or data.startswith("<TRUE_VALUE:f"):
                 return Bool("false")  # Boolean false symbol
-            elif data.startswith("<dummy>"):
+            elif data.startswith("<DUMMY") or data.startswith("<dummy>"):
                 return Dummy()  # Dummy symbol
             else:
                 print("Err node:", data)
@@ -41,12 +48,16 @@ class CSEMachineFactory:
     def get_b(self, node):
         b = B()
         b.symbols = self.get_pre_order_traverse(node)
-        return b
+        return self.share(b)
 
-    def get_lambda(self, node):
+    def get_lambda(self, node, name=None):
         lambda_expr = Lambda(self.i)
         self.i += 1
-        lambda_expr.set_delta(self.get_delta(node.get_children()[1]))
+        # A body that is itself a lambda, fn x. fn y. E or the function of a
+        # rec, belongs to the same function
+        lambda_expr.set_delta(self.get_delta(node.get_children()[1], name))
+        lambda_expr.name = name
+        lambda_expr.position = self.get_position(node.get_children()[0])
         if node.get_children()[0].get_data() == ",":
             for identifier in node.get_children()[0].get_children():
                 lambda_expr.identifiers.append(Id(identifier.get_data()[12:-1]))
@@ -54,26 +65,95 @@ class CSEMachineFactory:
             lambda_expr.identifiers.append(Id(node.get_children()[0].get_data()[12:-1]))
         return lambda_expr
 
-    def get_pre_order_traverse(self, node):
+    def get_pre_order_traverse(self, node, name=None):
+        # name is the name a lambda node is bound to
         symbols = []
         if node.get_data() == "lambda":
-            symbols.append(self.get_lambda(node))  # Lambda expression symbol
+            symbols.append(self.get_lambda(node, name))  # Lambda expression symbol
         elif node.get_data() == "->":
             symbols.append(self.get_delta(node.get_children()[1]))  # Delta symbol
             symbols.append(self.get_delta(node.get_children()[2]))  # Delta symbol
             symbols.append(Beta())  # Beta symbol
             symbols.append(self.get_b(node.get_children()[0]))  # B symbol
+        elif node.get_data() == "tau" and self.parallel and sum(map(self.is_expensive, node.get_children())) > 1:
+            symbols.append(self.get_parallel_tau(node))
         else:
             symbols.append(self.get_symbol(node))
-            for child in node.get_children():
-                symbols.extend(self.get_pre_order_traverse(child))
+            children = node.get_children()
+            names = [None] * len(children)
+            if node.get_data() == "gamma":
+                names[1] = self.get_function_name(children[0], children[1])
+            for child, child_name in zip(children, names):
+                symbols.extend(self.get_pre_order_traverse(child, child_name))
         return symbols
 
-    def get_delta(self, node):
+    def get_function_name(self, rator, rand):
+        # The name bound to rand in gamma(lambda(f, P), rand) and gamma(<Y*>, lambda(f, E))
+        if rator.get_data() == "lambda":
+            binding = rator.get_children()[0]
+        elif rator.get_data() == "<Y*>" and rand.get_data() == "lambda":
+            binding = rand.get_children()[0]
+        else:
+            return None
+        data = binding.get_data()
+        return data[12:-1] if data.startswith("<IDENTIFIER:") else None
+
+    def get_position(self, binding):
+        # Source position of a lambda's parameter, or of the first of its parameters
+        if binding.get_data() == "," and binding.get_children():
+            binding = binding.get_children()[0]
+        return getattr(binding, "position", None)
+
+    def get_parallel_tau(self, node):
+        children = node.get_children()
+        return ParallelTau([self.get_b(child) for child in children], [self.is_expensive(child) for child in children])
+
+    def is_expensive(self, node):
+        # Worth a process of its own: evaluating node calls a function that is
+        # not a built-in, so it may run for any number of steps
+        pending = [node]
+        while pending:
+            current = pending.pop()
+            if current.get_data() == "lambda":
+                continue
+            if current.get_data() == "gamma":
+                rator = current.get_children()[0].get_data()
+                if rator != "<Y*>" and not (rator.startswith("<IDENTIFIER:") and BUILTINS.get(rator[12:-1])):
+                    return True
+            pending.extend(current.get_children())
+        return False
+
+    def get_delta(self, node, name=None):
         delta = Delta(self.j)
         self.j += 1
-        delta.symbols = self.get_pre_order_traverse(node)
-        return delta
+        delta.symbols = self.get_pre_order_traverse(node, name)
+        return self.share(delta)
+
+    def share(self, block):
+        """Return the block made earlier with the same symbols, or block.
+
+        Its constant symbols are first replaced by the ones made earlier with
+        the same value. Lambdas are numbered, so a block holding one is never
+        the same as another; the machine only reads blocks and the constants
+        it pushes, so identical ones can be one object. A shared Delta keeps
+        the index of the first.
+        """
+        symbols = block.symbols
+        for i, symbol in enumerate(symbols):
+            key = self.get_constant_key(symbol)
+            if key is not None:
+                symbols[i] = self.constants.setdefault(key, symbol)
+        return self.blocks.setdefault((type(block), tuple(map(id, symbols))), block)
+
+    def get_constant_key(self, symbol):
+        t = type(symbol)
+        if t in (Id, Int, Str, Bool, Uop, Bop):
+            return t, symbol.get_data()
+        elif t in (Gamma, Beta, Ystar, Dummy, Tup, Err):
+            return t,
+        elif t is Tau:
+            return t, symbol.get_n()
+        return None
 
     def get_control(self, ast):
         control = [self.e0, self.get_delta(ast.get_root())]
@@ -85,8 +165,8 @@ class CSEMachineFactory:
     def get_environment(self):
         return [self.e0]
 
-    def get_cse_machine(self, ast):
+    def get_cse_machine(self, ast, builtins=None, output=None, memo=None, workers=0):
         control = self.get_control(ast)
         stack = self.get_stack()
         environment = self.get_environment()
-        return CSEMachine(control, stack, environment)
+        return CSEMachine(control, stack, environment, builtins, output, memo, workers)
@@ -1,18 +1,61 @@
+import io
 from .nodes import *
+from .builtin_functions import BUILTINS
+from . import operators
+from .memo_cache import get_value_key
+
+# Symbols run by execute_async between two yields to the event loop
+DEFAULT_SLICE = 1000
 
 class CSEMachine:
-    def __init__(self, control, stack, environment):
+    def __init__(self, control, stack, environment, builtins=None, output=None, memo=None, workers=0):
         self.control = control
         self.stack = stack
         self.environment = environment
+        self.builtins = builtins if builtins is not None else BUILTINS
+        # Text written by Print
+        self.output = output if output is not None else io.StringIO()
+        self.has_output = False
+        self.writes = 0
+        # Optional MemoCache of lambda applications, and the (key, writes)
+        # of each application in progress by the index of its environment
+        self.memo = memo
+        self.pending_results = {}
+        # Processes evaluating the expensive components of a ParallelTau
+        self.workers = workers
+        # Superinstructions run, by pattern
+        self.superinstruction_hits = {}
+        self.current_environment = environment[0] if environment else None
 
     
 
-    def execute(self):
-        # Execute the CSEMachine
-        current_environment = self.environment[0]
-        j = 1
-        while self.control:
+    def execute(self, environment=None, profiler=None):
+        # Execute the CSEMachine, in environment if given, and through
+        # profiler.run if given a Profiler
+        if environment is not None:
+            self.current_environment = environment
+        if profiler is not None:
+            profiler.run(self)
+        else:
+            self.run()
+
+    async def execute_async(self, steps=DEFAULT_SLICE):
+        # Execute the CSEMachine, yielding to the event loop every steps
+        # symbols so that many machines share one loop. Cancelling the task
+        # stops the machine at the next yield
+        import asyncio  # only loaded by programs embedding the machine in a loop
+        while not self.run(steps):
+            await asyncio.sleep(0)
+
+    def run(self, steps=-1):
+        # Run at most steps symbols, or to the end if steps is negative, and
+        # return whether the control is empty. The machine can be run again
+        # from where it stopped
+        current_environment = self.current_environment
+        j = len(self.environment)  # environment indices match list positions
+        hits = self.superinstruction_hits
+        while self.control and steps:
+            steps -= 1
             
             # change below paths to your own paths to see how the control and stack are changing
             # self.write_control_to_file("path to Control.txt")
@@ -22,9 +65,30 @@ class CSEMachine:
             if isinstance(current_symbol, Id):
                 self.stack.insert(0, current_environment.lookup(current_symbol))
                 # print(current_environment.lookup(current_symbol).get_data())
+            elif isinstance(current_symbol, Superinstruction):
+                # Handle a run of symbols fused by the peephole pass
+                hits[current_symbol.pattern] = hits.get(current_symbol.pattern, 0) + 1
+                if type(current_symbol) is BinaryOperation:
+                    self.stack.insert(0, self.apply_fused_operation(current_symbol, current_environment))
+                elif type(current_symbol) is Branch:
+                    if self.apply_fused_operation(current_symbol.test, current_environment).get_data() == "true":
+                        self.control.pop()
+                    else:
+                        self.control.pop(-2)
+                else:
+                    function = current_environment.lookup(current_symbol.identifier)
+                    builtin = self.builtins.get(function.get_data()) if type(function) is Symbol else None
+                    if builtin is not None:
+                        self.stack.insert(0, builtin(self, self.stack.pop(0)))
+                    elif type(function) is Builtin:
+                        self.stack.insert(0, function.apply(self, self.stack.pop(0)))
+                    else:
+                        # A closure, tuple or Eta: applied by the Gamma
+                        self.stack.insert(0, function)
+                        self.control.append(Gamma())
             elif isinstance(current_symbol, Lambda):
-                current_symbol.set_environment(current_environment.get_index())
-                self.stack.insert(0, current_symbol)
+                # Each evaluation makes its own closure, the Lambda in the Delta is shared
+                self.stack.insert(0, current_symbol.get_closure(current_environment.get_index()))
                 
                 
             elif isinstance(current_symbol, Gamma):
@@ -32,6 +96,15 @@ class CSEMachine:
                 if isinstance(next_symbol, Lambda):
                     # Handle Lambda expression
                     lambda_expr = next_symbol
+                    if self.memo is not None:
+                        key = get_value_key(self.stack[0])
+                        if key is not None:
+                            key = (lambda_expr.get_index(), lambda_expr.get_environment(), key)
+                            result = self.memo.get(key)
+                            if result is not None:
+                                self.stack[0] = result
+                                continue
+                            self.pending_results[j] = (key, self.writes)
                     e = E(j)
                     j += 1
                     if len(lambda_expr.identifiers) == 1:
@@ -40,10 +113,9 @@ class CSEMachine:
                     else:
                         tup = self.stack.pop(0)
                         for i, id in enumerate(lambda_expr.identifiers):
-                            e.values[id] = tup.symbols[i]
-                    for env in self.environment:
-                        if env.get_index() == lambda_expr.get_environment():
-                            e.set_parent(env)
+                            e.values[id] = tup.get_symbol(i)
+                    # Environment indices match their position in self.environment
+                    e.set_parent(self.environment[lambda_expr.get_environment()])
                     current_environment = e
                     self.control.append(e)
                     self.control.append(lambda_expr.get_delta())
@@ -53,10 +125,24 @@ class CSEMachine:
                     # Handle Tup expression
                     tup = next_symbol
                     i = int(self.stack.pop(0).get_data())
-                    self.stack.insert(0, tup.symbols[i - 1])
+                    self.stack.insert(0, tup.get_symbol(i - 1))
                 elif isinstance(next_symbol, Ystar):
                     # Handle Ystar expression
                     lambda_expr = self.stack.pop(0)
+                    body = lambda_expr.get_delta().symbols
+                    if len(body) == 1 and isinstance(body[0], Lambda):
+                        # rec f = fn x. E: bind f directly to the closure of fn x. E
+                        # in its own environment, so recursive calls are plain
+                        # Lambda applications instead of going through Eta
+                        e = E(j)
+                        j += 1
+                        e.set_parent(self.environment[lambda_expr.get_environment()])
+                        e.set_is_removed(True)
+                        self.environment.append(e)
+                        closure = body[0].get_closure(e.get_index())
+                        e.values[lambda_expr.identifiers[0]] = closure
+                        self.stack.insert(0, closure)
+                        continue
                     eta = Eta()
                     eta.set_index(lambda_expr.get_index())
                     eta.set_environment(lambda_expr.get_environment())
@@ -71,83 +157,23 @@ class CSEMachine:
                     self.control.append(Gamma())
                     self.stack.insert(0, eta)
                     self.stack.insert(0, lambda_expr)
+                elif isinstance(next_symbol, Builtin):
+                    # Handle partially applied built-in function
+                    self.stack.insert(0, next_symbol.apply(self, self.stack.pop(0)))
                 else:
-                    # Handle other symbols
-                    if next_symbol.get_data() == "Print":
-                        pass
-                    elif next_symbol.get_data() == "Stem":
-                        # implement Stem function
-                        s = self.stack.pop(0)
-                        s.set_data(s.get_data()[0])
-                        self.stack.insert(0, s)
-                    elif next_symbol.get_data() == "Stern":
-                        # implement Stern function
-                        s = self.stack.pop(0)
-                        s.set_data(s.get_data()[1:])
-                        self.stack.insert(0, s)
-                    elif next_symbol.get_data() == "Conc":
-                        # implement Conc function
-                        s1 = self.stack.pop(0)
-                        s2 = self.stack.pop(0)
-                        s1.set_data(s1.get_data() + s2.get_data())
-                        self.stack.insert(0, s1)
-                    elif next_symbol.get_data() == "Order":
-                        # implement Order function
-                        tup = self.stack.pop(0)
-                        n = Int(str(len(tup.symbols)))
-                        self.stack.insert(0, n)
-                    elif next_symbol.get_data() == "Isinteger":
-                        # implement Isinteger function
-                        if isinstance(self.stack[0], Int):
-                            self.stack.insert(0, Bool("true"))
-                        else:
-                            self.stack.insert(0, Bool("false"))
-                        self.stack.pop(1)
-                    elif next_symbol.get_data() == "Null":
-                        # implement Null function
-                        pass
-                    elif next_symbol.get_data() == "Itos":
-                        # implement Itos function
-                        pass
-                    elif next_symbol.get_data() == "Isstring":
-                        # implement Isstring function
-                        if isinstance(self.stack[0], Str):
-                            self.stack.insert(0, Bool("true"))
-                        else:
-                            self.stack.insert(0, Bool("false"))
-                        self.stack.pop(1)
-                    elif next_symbol.get_data() == "Istuple":
-                        # implement Istuple function
-                        if isinstance(self.stack[0], Tup):
-                            self.stack.insert(0, Bool("true"))
-                        else:
-                            self.stack.insert(0, Bool("false"))
-                        self.stack.pop(1)
-                    elif next_symbol.get_data() == "Isdummy":
-                        # implement Isdummy function
-                        if isinstance(self.stack[0], Dummy):
-                            self.stack.insert(0, Bool("true"))
-                        else:
-                            self.stack.insert(0, Bool("false"))
-                        self.stack.pop(1)
-                    elif next_symbol.get_data() == "Istruthvalue":
-                        # implement Istruthvalue function
-                        if isinstance(self.stack[0], Bool):
-                            self.stack.insert(0, Bool("true"))
-                        else:
-                            self.stack.insert(0, Bool("false"))
-                        self.stack.pop(1)
-                    elif next_symbol.get_data() == "Isfunction":
-                        # implement Isfunction function
-                        if isinstance(self.stack[0], Lambda):
-                            self.stack.insert(0, Bool("true"))
-                        else:
-                            self.stack.insert(0, Bool("false"))
-                        self.stack.pop(1)
+                    # Handle built-in function, bound to a Symbol carrying its name
+                    function = self.builtins.get(next_symbol.get_data()) if type(next_symbol) is Symbol else None
+                    if function is None:
+                        raise ValueError(f"Cannot apply '{next_symbol.get_data()}' as a function")
+                    self.stack.insert(0, function(self, self.stack.pop(0)))
 
             elif isinstance(current_symbol, E):
                 # Handle E expression
                 self.stack.pop(1)
+                if current_symbol.get_index() in self.pending_results:
+                    key, writes = self.pending_results.pop(current_symbol.get_index())
+                    if writes == self.writes:
+                        self.memo.put(key, self.stack[0])
                 self.environment[current_symbol.get_index()].set_is_removed(True)
                 y = len(self.environment)
                 while y > 0:
@@ -183,13 +209,25 @@ class CSEMachine:
                 
                 
                 
+            elif isinstance(current_symbol, ParallelTau):
+                if steps < 0:
+                    from .parallel import evaluate_parallel  # loaded with the first ParallelTau
+                    self.stack.insert(0, Tup(evaluate_parallel(self, current_symbol, current_environment)))
+                    j = len(self.environment)  # the components added environments
+                else:
+                    # A run of a given number of steps, e.g. when profiling
+                    # or checkpointing, evaluates the components here as a Tau
+                    # does, so every step counts and the run can stop
+                    self.control.append(Tau(current_symbol.get_n()))
+                    for component in current_symbol.components:
+                        self.control.extend(component.symbols)
             elif isinstance(current_symbol, Tau):
                 # Handle Tau expression
                 tau = current_symbol
-                tup = Tup()
-                for _ in range(tau.get_n()):
-                    tup.symbols.append(self.stack.pop(0))
-                self.stack.insert(0, tup)
+                symbols = self.stack[:tau.get_n()]
+                del self.stack[:tau.get_n()]
+                values = get_int_array(symbols) if tau.get_n() >= ARRAY_MIN_ORDER else None
+                self.stack.insert(0, Tup(values if values is not None else symbols))
             elif isinstance(current_symbol, Delta):
                 # Handle Delta expression
                 self.control.extend(current_symbol.symbols)
@@ -198,6 +236,8 @@ class CSEMachine:
                 self.control.extend(current_symbol.symbols)
             else:
                 self.stack.insert(0, current_symbol)
+        self.current_environment = current_environment
+        return not self.control
 
     
 
@@ -241,6 +281,18 @@ class CSEMachine:
         open(file_path, 'w').close()
     
 
+    def get_child_machine(self, symbols, output):
+        # A machine for one control structure, on this machine's environments
+        return CSEMachine(list(symbols), [], self.environment, self.builtins, output, self.memo, self.workers)
+
+    def evaluate(self, symbols, environment):
+        # Evaluate a control structure in environment and return its value
+        child = self.get_child_machine(symbols, self.output)
+        child.execute(environment)
+        self.has_output = self.has_output or child.has_output
+        self.writes += child.writes
+        return child.stack[0]
+
     def print_environment(self):
         # Print the environment symbols
         for symbol in self.environment:
@@ -251,95 +303,75 @@ class CSEMachine:
                 print()
                 
     def covert_string_to_bool(self, data):
-        if data == "true":
-            return True
-        elif data == "false":
-            return False
+        return operators.covert_string_to_bool(data)
 
     def apply_unary_operation(self, rator, rand):
-        # Apply unary operation
-        if rator.get_data() == "neg":
-            val = int(rand.get_data())
-            return Int(str(-1 * val))
-        elif rator.get_data() == "not":
-            val = self.covert_string_to_bool(rand.get_data())
-            return Bool(str(not val).lower())
-        else:
-            return Err()
+        return operators.apply_unary_operation(rator, rand)
 
     def apply_binary_operation(self, rator, rand1, rand2):
-        op = rator.get_data()
-        
-        # Arithmetic operations
-        if op in ["+", "-", "*", "/", "**"]:
-            val1 = int(rand1.get_data())
-            val2 = int(rand2.get_data())
-            
-            result = {
-                "+": val1 + val2,
-                "-": val1 - val2,
-                "*": val1 * val2,
-                "/": int(val1 / val2),
-                "**": val1 ** val2
-            }[op]
-            
-            return Int(str(result))
-            
-        # Logical operations
-        elif op in ["&", "or"]:
-            val1 = self.covert_string_to_bool(rand1.get_data())
-            val2 = self.covert_string_to_bool(rand2.get_data())
-            
-            result = val1 and val2 if op == "&" else val1 or val2
-            return Bool(str(result).lower())
-            
-        # Comparison operations
-        elif op in ["eq", "ne", "ls", "le", "gr", "ge"]:
-            if op in ["ls", "le", "gr", "ge"]:
-                val1 = int(rand1.get_data())
-                val2 = int(rand2.get_data())
-            else:
-                val1 = rand1.get_data()
-                val2 = rand2.get_data()
-                
-            result = {
-                "eq": val1 == val2,
-                "ne": val1 != val2,
-                "ls": val1 < val2,
-                "le": val1 <= val2,
-                "gr": val1 > val2,
-                "ge": val1 >= val2
-            }[op]
-            
-            return Bool(str(result).lower())
-            
-        # Tuple augmentation
-        elif op == "aug":
-            if isinstance(rand2, Tup):
-                rand1.symbols.extend(rand2.symbols)
-            else:
-                rand1.symbols.append(rand2)
-            return rand1
-            
-        return Err()
+        return operators.apply_binary_operation(rator, rand1, rand2)
+
+    def apply_fused_operation(self, operation, environment):
+        # Apply the Bop of a BinaryOperation to its operands' values
+        rand1 = operation.rand1
+        if type(rand1) is Id:
+            rand1 = environment.lookup(rand1)
+        rand2 = operation.rand2
+        if type(rand2) is Id:
+            rand2 = environment.lookup(rand2)
+        return operators.apply_binary_operation(operation.rator, rand1, rand2)
 
     def get_tuple_value(self, tup):
-        result = "("
-        for symbol in tup.symbols:
-            if isinstance(symbol, Tup):
-                result += self.get_tuple_value(symbol) + ", "
+        pieces = []
+        self.render_value(tup, pieces.append)
+        return "".join(pieces)
+
+    def get_symbol_value(self, symbol):
+        # Get the printed form of a value that is not a tuple
+        if isinstance(symbol, Lambda):
+            return f"[lambda closure: {','.join(id.get_data() for id in symbol.identifiers)}: {symbol.get_index()}]"
+        return symbol.get_data()
+
+    def get_value(self, symbol):
+        # Get the printed form of a value
+        if isinstance(symbol, Tup):
+            return self.get_tuple_value(symbol)
+        return self.get_symbol_value(symbol)
+
+    def render_value(self, symbol, write, escape=False):
+        # Write the printed form of a value piece by piece. Iterative, so deeply
+        # nested tuples neither recurse nor build intermediate strings
+        pending = [symbol]
+        while pending:
+            symbol = pending.pop()
+            if isinstance(symbol, str):
+                write(symbol)
+            elif isinstance(symbol, Tup) and symbol.get_values() is not None:
+                # Integers are written straight from their array
+                write("(" + ", ".join(map(str, symbol.get_values())) + ")")
+            elif isinstance(symbol, Tup):
+                pending.append(")")
+                symbols = symbol.get_symbols()
+                for i in range(symbol.get_n() - 1, -1, -1):
+                    pending.append(symbols[i])
+                    if i > 0:
+                        pending.append(", ")
+                pending.append("(")
+            elif escape and isinstance(symbol, Str):
+                write(symbol.get_data().replace("\\n", "\n").replace("\\t", "\t"))
             else:
-                result += symbol.get_data() + ", "
-                
-        # Remove trailing comma and space
-        if len(tup.symbols) > 0:
-            result = result[:-2]
-            
-        return result + ")"
+                write(self.get_symbol_value(symbol))
+
+    def write_value(self, symbol):
+        # Write a value to the output, as done by Print
+        self.render_value(symbol, self.output.write, escape=True)
+        self.has_output = True
+        self.writes += 1
 
     def get_answer(self):
-        # Get the answer from the CSEMachine
+        # Get the answer from the CSEMachine: the text written by Print if the
+        # program printed anything, otherwise the value it evaluated to
         self.execute()
-        if isinstance(self.stack[0], Tup):
-            return self.get_tuple_value(self.stack[0])
-        return self.stack[0].get_data()
+        if self.has_output and isinstance(self.output, io.StringIO):
+            return self.output.getvalue()
+        return self.get_value(self.stack[0])
@@ -0,0 +1,17 @@
+# Constants the command line needs before any phase runs: the signature of
+# compiled programs, which it sniffs, and default sizes for its options.
+# This module imports nothing, so reading them loads no other module.
+
+# First bytes of a compiled program file, see CSE_Machine.artifact
+ARTIFACT_MAGIC = b"RPALC\0"
+
+# Entries kept by a MemoCache unless told otherwise
+DEFAULT_MEMO_SIZE = 1 << 16
+
+def is_artifact(path):
+    """Whether the file at path is a compiled RPAL program."""
+    try:
+        with open(path, "rb") as file:
+            return file.read(len(ARTIFACT_MAGIC)) == ARTIFACT_MAGIC
+    except OSError:
+        return False
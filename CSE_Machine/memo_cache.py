@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from .nodes import *
+from .defaults import DEFAULT_MEMO_SIZE
+
+# Entries of a key past which tuples are keyed by identity instead of by
+# their components, so building a key stays cheap for large arguments
+MAX_KEY_ENTRIES = 64
+
+class MemoCache:
+    """Bounded cache of function application results, least recently used out.
+
+    The CSE machine keys a result by the applied closure, its lambda index and
+    environment index, and by get_value_key of the argument. Applications
+    during which the program printed are not recorded, so a cache hit never
+    drops output.
+    """
+
+    def __init__(self, max_size=DEFAULT_MEMO_SIZE):
+        self.max_size = max_size
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the result cached under key, or None."""
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.results.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self.results[key] = result
+        self.results.move_to_end(key)
+        if len(self.results) > self.max_size:
+            self.results.popitem(last=False)
+            self.evictions += 1
+
+    def get_stats(self):
+        return f"{self.hits} hits, {self.misses} misses, {self.evictions} evictions, {len(self.results)} entries"
+
+
+def get_value_key(symbol):
+    """Return a hashable key equal for structurally equal values, or None.
+
+    Closures are equal when they share their lambda and environment. Values
+    with no such key, e.g. partially applied built-ins, return None and the
+    application is not cached. Tuples of more than MAX_KEY_ENTRIES
+    components, and tuples met once the key has that many entries, are
+    keyed by the Tup itself: Tups never change and compare by identity, so
+    such a key only matches the same tuple, and building it is bounded.
+    """
+    # Tuples are flattened iteratively into a sequence of markers and keys
+    key = []
+    pending = [symbol]
+    while pending:
+        symbol = pending.pop()
+        t = type(symbol)
+        if t is Tup and (symbol.get_n() > MAX_KEY_ENTRIES or len(key) >= MAX_KEY_ENTRIES):
+            key.append(("tup", symbol))
+        elif t is Tup and symbol.get_values() is not None:
+            # A small tuple of integers, keyed by the bytes of its array
+            key.append(("ints", bytes(symbol.get_values())))
+        elif t is Tup:
+            key.append(("tup", symbol.get_n()))
+            pending.extend(reversed(symbol.get_symbols()))
+        elif t in (Int, Str, Bool):
+            key.append((t.__name__, symbol.get_data()))
+        elif t is Dummy:
+            key.append("dummy")
+        elif t is Lambda:
+            key.append(("lambda", symbol.get_index(), symbol.get_environment()))
+        elif t is Eta:
+            key.append(("eta", symbol.get_index(), symbol.get_environment()))
+        elif t is Symbol:
+            key.append(("symbol", symbol.get_data()))
+        else:
+            return None
+    return tuple(key)
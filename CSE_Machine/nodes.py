@@ -1,3 +1,5 @@
+from array import array
+
 class Symbol:
     def __init__(self, data):
         self.data = data
@@ -32,6 +34,15 @@ class Bool(Rand):
     def __init__(self, data):
         super().__init__(data)
 
+class Builtin(Symbol):
+    # A built-in function value, e.g. Conc partially applied to its first argument
+    def __init__(self, data, function):
+        super().__init__(data)
+        self.function = function
+
+    def apply(self, machine, rand):
+        return self.function(machine, rand)
+
 class Bop(Rator):
     def __init__(self, data):
         super().__init__(data)
@@ -142,6 +153,11 @@ class Lambda(Symbol):
         self.environment = None
         self.identifiers = []
         self.delta = None
+        # The name the lambda is bound to, if any, and the (line, column) of
+        # its parameter, for profiles. Kept here since the delta may be
+        # shared with identical bodies
+        self.name = None
+        self.position = None
 
     def set_environment(self, n):
         self.environment = n
@@ -157,10 +173,138 @@ class Lambda(Symbol):
     def get_index(self):
         return self.index
 
+    def get_closure(self, n):
+        # Copy of this lambda bound to environment n, sharing the delta and identifiers
+        closure = Lambda(self.index)
+        closure.identifiers = self.identifiers
+        closure.delta = self.delta
+        closure.name = self.name
+        closure.position = self.position
+        closure.environment = n
+        return closure
+
+class ParallelTau(Symbol):
+    # A tau whose components are kept as separate control structures, so the
+    # expensive ones can be evaluated in other processes
+    def __init__(self, components, expensive):
+        super().__init__("tau")
+        self.components = components
+        self.expensive = expensive
+
+    def get_n(self):
+        return len(self.components)
+
 class Str(Rand):
-    def __init__(self, data):
+    def __init__(self, data, start=0, end=None):
         super().__init__(data)
+        # A view of data[start:end]. Stem, Stern and Conc build new views or
+        # ropes instead of copying, the text is only materialized by get_data
+        self.start = start
+        self.end = len(data) if end is None else end
+        self.parts = None
 
+    def get_length(self):
+        return self.end - self.start
+
+    def get_data(self):
+        if self.parts is not None:
+            self.flatten()
+        if self.start != 0 or self.end != len(self.data):
+            self.data = self.data[self.start:self.end]
+            self.start = 0
+            self.end = len(self.data)
+        return self.data
+
+    def equals(self, other):
+        # Compare the text of two strings without materializing views: the
+        # lengths first, the text only when they match
+        if self.get_length() != other.get_length():
+            return False
+        if self.parts is not None:
+            self.flatten()
+        if other.parts is not None:
+            other.flatten()
+        if self.data is other.data and self.start == other.start:
+            return True
+        return self.data[self.start:self.end] == other.data[other.start:other.end]
+
+    def flatten(self):
+        # Iterative, since ropes built by repeated Conc are deeply left nested
+        chunks = []
+        pending = [self]
+        while pending:
+            s = pending.pop()
+            if s.parts is not None:
+                pending.append(s.parts[1])
+                pending.append(s.parts[0])
+            else:
+                chunks.append(s.data[s.start:s.end])
+        self.data = "".join(chunks)
+        self.start = 0
+        self.end = len(self.data)
+        self.parts = None
+
+    def __getstate__(self):
+        # Ropes would pickle as deeply nested objects
+        if self.parts is not None:
+            self.flatten()
+        return self.__dict__
+
+    def stem(self):
+        if self.parts is not None:
+            self.flatten()
+        if self.start >= self.end:
+            raise IndexError("Stem applied to an empty string")
+        return Str(self.data, self.start, self.start + 1)
+
+    def stern(self):
+        if self.parts is not None:
+            self.flatten()
+        if self.start >= self.end:
+            raise IndexError("Stern applied to an empty string")
+        return Str(self.data, self.start + 1, self.end)
+
+    def concat(self, other):
+        if other.get_length() == 0:
+            return self
+        if self.get_length() == 0:
+            return other
+        rope = Str("", 0, self.get_length() + other.get_length())
+        rope.parts = (self, other)
+        return rope
+
+
+class Superinstruction(Symbol):
+    # A run of symbols fused by CSE_Machine.peephole, run by the machine in
+    # one step. pattern names the run, for the hit counts
+    pattern = None
+
+class ApplyId(Superinstruction):
+    # gamma Id: apply the value of an identifier, usually a built-in, to the
+    # value on top of the stack
+    pattern = "gamma Id"
+
+    def __init__(self, identifier):
+        super().__init__("gamma")
+        self.identifier = identifier
+
+class BinaryOperation(Superinstruction):
+    # Bop with two operands, each an identifier or a constant
+    def __init__(self, rator, rand1, rand2):
+        super().__init__(rator.get_data())
+        self.rator = rator
+        self.rand1 = rand1
+        self.rand2 = rand2
+        self.pattern = f"{type(rand1).__name__} {type(rand2).__name__} Bop"
+
+class Branch(Superinstruction):
+    # beta B for a condition that is one BinaryOperation: test and choose
+    # between the two Deltas below in one step
+    pattern = "-> test"
+
+    def __init__(self, test):
+        super().__init__("beta")
+        self.test = test
 
 class Tau(Symbol):
     def __init__(self, n):
@@ -174,9 +318,97 @@ class Tau(Symbol):
         return self.n
 
 class Tup(Rand):
-    def __init__(self):
+    def __init__(self, symbols=None, n=None):
         super().__init__("tup")
-        self.symbols = []
+        # The symbols list may be shared with other tuples; this tuple only
+        # owns its first n entries, so it is never changed after creation.
+        # A tuple of integers may hold an array('q') of their values instead
+        self.symbols = symbols if symbols is not None else []
+        self.n = len(self.symbols) if n is None else n
+
+    def get_n(self):
+        return self.n
+
+    def get_symbol(self, i):
+        if i < 0 or i >= self.n:
+            raise IndexError(f"tuple index {i + 1} out of range for tuple of order {self.n}")
+        if type(self.symbols) is array:
+            return Int(str(self.symbols[i]))
+        return self.symbols[i]
+
+    def get_symbols(self):
+        if type(self.symbols) is array:
+            return [Int(str(value)) for value in self.symbols[:self.n]]
+        if self.n == len(self.symbols):
+            return self.symbols
+        return self.symbols[:self.n]
+
+    def get_values(self):
+        # The array of the integers, or None for a tuple of symbols
+        if type(self.symbols) is not array:
+            return None
+        return self.symbols if self.n == len(self.symbols) else self.symbols[:self.n]
+
+    def extend(self, symbols):
+        # symbols may be the array of a tuple of integers
+        if type(self.symbols) is array or (self.n == 0 and (type(symbols) is array or len(symbols) == 1)):
+            # Integers appended to integers, or one integer or an array
+            # appended to nil, stay in an array
+            values = symbols if type(symbols) is array else get_int_array(symbols)
+            if values is not None:
+                base = self.symbols if type(self.symbols) is array else array("q")
+                if self.n == len(base) and self.n > 0:
+                    base.extend(values)
+                    return Tup(base, len(base))
+                return Tup(base[:self.n] + values)
+        if type(symbols) is array:
+            symbols = [Int(str(value)) for value in symbols]
+        if self.n == len(self.symbols) and type(self.symbols) is list and self.n > 0:
+            # Nothing has been appended past this tuple yet, so the list can be
+            # shared with the result and the append is amortized O(1). The
+            # list of nil, a literal shared by every Delta, is never extended
+            self.symbols.extend(symbols)
+            return Tup(self.symbols, len(self.symbols))
+        if self.n == 0:
+            return Tup(list(symbols))
+        # Tuples over a Python tuple, e.g. the literals of a shared
+        # rpal.Program, are never appended to
+        return Tup(list(self.get_symbols()) + list(symbols))
+
+    def aug(self, symbol):
+        if type(self.symbols) is array and self.n == len(self.symbols) and self.n > 0:
+            value = get_int_value(symbol)
+            if value is not None:
+                self.symbols.append(value)
+                return Tup(self.symbols, self.n + 1)
+        return self.extend((symbol,))
+
+# Order from which a tuple of integers built by a tau is kept in an array.
+# Smaller ones, e.g. the arguments of a function, are read back as symbols
+ARRAY_MIN_ORDER = 16
+
+def get_int_array(symbols):
+    """Return the values of symbols as an array('q'), or None.
+
+    None unless every symbol is an Int whose text is the decimal form of a
+    64-bit value, so that Int(str(value)) gives back the same symbol.
+    """
+    values = array("q")
+    for symbol in symbols:
+        value = get_int_value(symbol)
+        if value is None:
+            return None
+        values.append(value)
+    return values
+
+def get_int_value(symbol):
+    # The value an array element holds for symbol, or None
+    if type(symbol) is not Int:
+        return None
+    value = int(symbol.data)
+    if str(value) != symbol.data or not -2 ** 63 <= value < 2 ** 63:
+        return None
+    return value
 
 
 class Uop(Rator):
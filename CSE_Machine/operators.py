@@ -0,0 +1,99 @@
+from .nodes import *
+
+def covert_string_to_bool(data):
+    if data == "true":
+        return True
+    elif data == "false":
+        return False
+
+def divide(val1, val2):
+    # Integer division truncating toward zero, exact for large integers
+    result = abs(val1) // abs(val2)
+    return result if (val1 < 0) == (val2 < 0) else -result
+
+# Only the requested operation is evaluated, so e.g. a zero right operand
+# of '+' no longer trips the division
+ARITHMETIC_OPERATIONS = {
+    "+": lambda val1, val2: val1 + val2,
+    "-": lambda val1, val2: val1 - val2,
+    "*": lambda val1, val2: val1 * val2,
+    "/": divide,
+    "**": lambda val1, val2: val1 ** val2
+}
+
+COMPARISON_OPERATIONS = {
+    "eq": lambda val1, val2: val1 == val2,
+    "ne": lambda val1, val2: val1 != val2,
+    "ls": lambda val1, val2: val1 < val2,
+    "le": lambda val1, val2: val1 <= val2,
+    "gr": lambda val1, val2: val1 > val2,
+    "ge": lambda val1, val2: val1 >= val2
+}
+
+def get_truth_value(data):
+    # The operand of & and or, which must be a truth value
+    if data == "true":
+        return True
+    elif data == "false":
+        return False
+    raise ValueError(f"Expected a truth value, got '{data}'")
+
+def apply_logical_operation(op, data1, data2):
+    """Apply & or or to two operands given by their data."""
+    val1 = get_truth_value(data1)
+    val2 = get_truth_value(data2)
+    return val1 and val2 if op == "&" else val1 or val2
+
+def apply_comparison(op, data1, data2):
+    """Compare two operands given by their data.
+
+    eq and ne compare the data itself, so e.g. any two tuples are equal;
+    the orderings compare integers and raise ValueError for other operands.
+    Shared by the CSE machine and the closure engine.
+    """
+    if op == "eq":
+        return data1 == data2
+    elif op == "ne":
+        return data1 != data2
+    return COMPARISON_OPERATIONS[op](int(data1), int(data2))
+
+def apply_unary_operation(rator, rand):
+    # Apply unary operation
+    if rator.get_data() == "neg":
+        val = int(rand.get_data())
+        return Int(str(-1 * val))
+    elif rator.get_data() == "not":
+        val = covert_string_to_bool(rand.get_data())
+        return Bool(str(not val).lower())
+    else:
+        return Err()
+
+def apply_binary_operation(rator, rand1, rand2):
+    op = rator.get_data()
+
+    # Arithmetic operations
+    if op in ARITHMETIC_OPERATIONS:
+        val1 = int(rand1.get_data())
+        val2 = int(rand2.get_data())
+        return Int(str(ARITHMETIC_OPERATIONS[op](val1, val2)))
+
+    # Logical operations
+    elif op in ["&", "or"]:
+        result = apply_logical_operation(op, rand1.get_data(), rand2.get_data())
+        return Bool(str(result).lower())
+
+    # Comparison operations
+    elif op in COMPARISON_OPERATIONS:
+        if op in ["eq", "ne"] and type(rand1) is Str and type(rand2) is Str:
+            # Views of long strings are compared without copying them
+            return Bool(str(rand1.equals(rand2) == (op == "eq")).lower())
+        return Bool(str(apply_comparison(op, rand1.get_data(), rand2.get_data())).lower())
+
+    # Tuple augmentation
+    elif op == "aug":
+        if isinstance(rand2, Tup):
+            values = rand2.get_values()
+            return rand1.extend(values if values is not None else rand2.get_symbols())
+        return rand1.aug(rand2)
+
+    return Err()
@@ -0,0 +1,33 @@
+class OutputBuffer:
+    """Buffered writer for program output.
+
+    Collects the pieces written by Print and flushes them to the underlying
+    stream in large chunks, so output streams while the program runs without
+    a system call per piece. On a terminal the buffer is also flushed at each
+    newline, so progress lines show up as they are printed.
+    """
+
+    def __init__(self, stream, limit=1 << 16):
+        self.stream = stream
+        self.limit = limit
+        self.pieces = []
+        self.size = 0
+        try:
+            self.line_buffered = stream.isatty()
+        except (AttributeError, ValueError):
+            self.line_buffered = False
+
+    def write(self, text):
+        """Append text, flushing once the buffered size reaches the limit, or at a newline on a terminal."""
+        self.pieces.append(text)
+        self.size += len(text)
+        if self.size >= self.limit or (self.line_buffered and "\n" in text):
+            self.flush()
+
+    def flush(self):
+        """Write all buffered text to the stream."""
+        if self.pieces:
+            self.stream.write("".join(self.pieces))
+            self.pieces.clear()
+            self.size = 0
+        self.stream.flush()
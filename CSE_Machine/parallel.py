@@ -0,0 +1,139 @@
+import io
+import os
+import pickle
+from .nodes import *
+
+# Steps an expensive component runs in this process before it is handed to
+# a worker, so that components that turn out to be cheap are not forked
+STEP_BUDGET = 20000
+
+def can_fork():
+    return hasattr(os, "fork")
+
+def to_portable(symbol):
+    """Return a copy of a value that can be sent to another process, or None.
+
+    Closures refer to environments that only exist in the process that made
+    them, so values holding them are not portable.
+    """
+    t = type(symbol)
+    if t is Tup:
+        symbols = [to_portable(s) for s in symbol.get_symbols()]
+        if any(s is None for s in symbols):
+            return None
+        return Tup(symbols)
+    if t is Str:
+        return Str(symbol.get_data())
+    if t in (Int, Bool, Dummy, Symbol):
+        return symbol
+    return None
+
+
+class Worker:
+    """A forked process finishing the evaluation of one tuple component.
+
+    The child inherits the machine evaluating the component, stopped after
+    its step budget, so it sees every environment and closure as they are.
+    It sends back the portable value, the text printed by the component and
+    its number of Print calls, or None if the component failed or evaluated
+    to a closure.
+    """
+
+    def __init__(self, child):
+        read, write = os.pipe()
+        self.pid = os.fork()
+        if self.pid == 0:
+            os.close(read)
+            self.run(child, write)
+        os.close(write)
+        self.read = read
+
+    def run(self, child, write):
+        result = None
+        try:
+            child.workers = 0  # tuples inside run sequentially in this process
+            child.execute()
+            value = to_portable(child.stack[0])
+            if value is not None:
+                result = (value, child.output.getvalue(), child.writes)
+        except BaseException:
+            pass
+        try:
+            with os.fdopen(write, "wb") as file:
+                pickle.dump(result, file)
+        finally:
+            # Skip the parent's exit handlers and buffered output
+            os._exit(0)
+
+    def get_result(self):
+        with os.fdopen(self.read, "rb") as file:
+            data = file.read()
+        os.waitpid(self.pid, 0)
+        try:
+            return pickle.loads(data)
+        except Exception:
+            return None
+
+
+def evaluate_parallel(machine, tau, environment):
+    """Evaluate the components of a ParallelTau and return their values.
+
+    Components are taken in the order of the sequential machine, last to
+    first. Each expensive one first runs here for STEP_BUDGET steps; one
+    still running then is handed to a worker process, up to
+    machine.workers of them, or finished here if none is free. The others
+    are evaluated here at their turn. Output printed by a component is
+    written out at its turn, and a component that failed, here or in its
+    worker, is evaluated again at its turn, so the output and any error are
+    those of a sequential run.
+    """
+    n = tau.get_n()
+    order = range(n - 1, -1, -1)
+    if machine.workers < 2 or not can_fork():
+        return [machine.evaluate(tau.components[i].symbols, environment) for i in order][::-1]
+
+    # By component: (value, text, writes) or a Worker; None to evaluate again
+    results = {}
+    workers = 0
+    try:
+        for i in order:
+            if not tau.expensive[i]:
+                continue
+            start = len(machine.environment)
+            child = machine.get_child_machine(tau.components[i].symbols, io.StringIO())
+            child.current_environment = environment
+            try:
+                if not child.run(STEP_BUDGET) and workers < machine.workers:
+                    results[i] = Worker(child)
+                    workers += 1
+                    continue
+                child.execute()
+                results[i] = (child.stack[0], child.output.getvalue(), child.writes)
+            except Exception:
+                results[i] = None
+            finally:
+                # The machine finds its current environment as the last one
+                # not removed, so close those left open by the component
+                for e in machine.environment[start:]:
+                    e.set_is_removed(True)
+
+        values = [None] * n
+        for i in order:
+            result = results.pop(i, None)
+            if type(result) is Worker:
+                result = result.get_result()
+            if result is None:
+                values[i] = machine.evaluate(tau.components[i].symbols, environment)
+            else:
+                value, text, writes = result
+                if writes:
+                    machine.output.write(text)
+                    machine.has_output = True
+                    machine.writes += writes
+                values[i] = value
+    finally:
+        # Reap workers left running by an error
+        for result in results.values():
+            if type(result) is Worker:
+                result.get_result()
+    return values
@@ -0,0 +1,84 @@
+from .nodes import *
+
+# Constants a BinaryOperation takes as operands, pushed as they are by the machine
+CONSTANTS = (Int, Str, Bool)
+
+class Peephole:
+    """Fuses common runs of control symbols into superinstructions.
+
+    The symbols of a Delta or B are the pre-order of a standardized tree, so
+    an operator is followed by its operands and a leaf is a single symbol:
+
+        Gamma Id            ApplyId: the rator is the identifier
+        Bop x y             BinaryOperation, x and y identifiers or constants
+        Beta B              Branch, when the B is one BinaryOperation
+
+    Each superinstruction does in one step what its run does, with the
+    intermediate values kept off the stack. The rewrite is done in place on
+    every control structure reachable from the root; counts holds the
+    number of each pattern fused.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.done = set()  # ids of the blocks rewritten
+
+    def optimize(self, root):
+        """Rewrite the blocks reachable from root and return the number of fused runs."""
+        seen = {id(root)}
+        pending = [root]
+        blocks = []
+        while pending:
+            block = pending.pop()
+            blocks.append(block)
+            for symbol in block.symbols:
+                if isinstance(symbol, Lambda):
+                    children = [symbol.get_delta()]
+                elif isinstance(symbol, ParallelTau):
+                    children = symbol.components
+                else:
+                    children = [symbol]
+                for child in children:
+                    if isinstance(child, (Delta, B)) and id(child) not in seen:
+                        seen.add(id(child))
+                        pending.append(child)
+        before = sum(self.counts.values())
+        for block in blocks:
+            self.rewrite(block)
+        return sum(self.counts.values()) - before
+
+    def rewrite(self, block):
+        if id(block) in self.done:
+            return
+        self.done.add(id(block))
+        symbols = block.symbols
+        fused = []
+        i = 0
+        while i < len(symbols):
+            symbol = symbols[i]
+            following = symbols[i + 1:i + 3]
+            t = type(symbol)
+            if t is Gamma and following and type(following[0]) is Id:
+                symbol = ApplyId(following[0])
+                i += 2
+            elif t is Bop and len(following) == 2 and all(map(self.is_operand, following)):
+                symbol = BinaryOperation(symbol, *following)
+                i += 3
+            elif t is Beta and following and type(following[0]) is B and self.is_test(following[0]):
+                symbol = Branch(following[0].symbols[0])
+                i += 2
+            else:
+                fused.append(symbol)
+                i += 1
+                continue
+            fused.append(symbol)
+            self.counts[symbol.pattern] = self.counts.get(symbol.pattern, 0) + 1
+        block.symbols = fused
+
+    def is_test(self, b):
+        # A condition that is one BinaryOperation once fused itself
+        self.rewrite(b)
+        return len(b.symbols) == 1 and type(b.symbols[0]) is BinaryOperation
+
+    def is_operand(self, symbol):
+        return type(symbol) is Id or type(symbol) in CONSTANTS
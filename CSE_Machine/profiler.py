@@ -0,0 +1,130 @@
+import time
+from .nodes import *
+
+# Name of the frame of the program's top level
+MAIN = "main"
+
+def get_function_label(lambda_expr):
+    """Return "name@line:column" for the function a Lambda belongs to.
+
+    The name is the one the factory found the lambda bound to, "lambda" if
+    none; the position is that of its parameter in the source.
+    """
+    name = getattr(lambda_expr, "name", None) or "lambda"
+    position = getattr(lambda_expr, "position", None)
+    if position is None:
+        return name
+    return f"{name}@{position[0]}:{position[1]}"
+
+
+class FunctionStats:
+    def __init__(self):
+        self.calls = 0
+        self.self_steps = 0
+        self.inclusive_steps = 0
+        self.self_time = 0.0
+        self.inclusive_time = 0.0
+
+
+class Profiler:
+    """Counts the steps, calls and time of each RPAL function a CSE machine runs.
+
+    The machine is run one symbol at a time. Applying a closure opens a frame
+    for its function, identified by get_function_label, and the E marker of
+    that application closes it. Each step is charged to the innermost frame;
+    inclusive counts and times include the frames it opened, once per
+    function even when it recurses. Steps are also counted per stack of
+    frames, for collapsed-stack output.
+    """
+
+    def __init__(self):
+        self.functions = {}  # label -> FunctionStats
+        self.stacks = {}  # (label, ...) from MAIN to the innermost frame -> steps
+        # Open frames: (environment index, label, stack, steps and time at entry)
+        self.frames = []
+        self.active = {}  # label -> number of open frames of that function
+        self.steps = 0
+        self.pending = 0  # steps not yet charged to the innermost frame
+        self.last_time = None
+
+    def run(self, machine, steps=-1):
+        """Run machine as CSEMachine.run does, profiling each step."""
+        control = machine.control
+        stack = machine.stack
+        environment = machine.environment
+        clock = time.perf_counter
+        if not self.frames:
+            self.last_time = clock()
+            self.enter(0, MAIN, self.last_time)
+        while control and steps:
+            steps -= 1
+            symbol = control[-1]
+            t = type(symbol)
+            applied = stack[0] if t is Gamma and type(stack[0]) is Lambda else None
+            count = len(environment)
+            machine.run(1)
+            self.pending += 1
+            if applied is not None and len(environment) > count:
+                # A new environment for the application, not a memo cache hit
+                now = clock()
+                self.charge(now)
+                self.enter(count, get_function_label(applied), now)
+            elif t is E and self.frames[-1][0] == symbol.get_index():
+                now = clock()
+                self.charge(now)
+                self.leave(now)
+        if not control:
+            self.finish()
+        return not control
+
+    def enter(self, index, label, now):
+        stack = self.frames[-1][2] + (label,) if self.frames else (label,)
+        self.frames.append((index, label, stack, self.steps, now))
+        self.active[label] = self.active.get(label, 0) + 1
+        stats = self.functions.get(label)
+        if stats is None:
+            stats = self.functions[label] = FunctionStats()
+        stats.calls += 1
+
+    def charge(self, now):
+        # Charge the steps and time since the last call or return to the innermost frame
+        _, label, stack, _, _ = self.frames[-1]
+        stats = self.functions[label]
+        stats.self_steps += self.pending
+        stats.self_time += now - self.last_time
+        self.stacks[stack] = self.stacks.get(stack, 0) + self.pending
+        self.steps += self.pending
+        self.pending = 0
+        self.last_time = now
+
+    def leave(self, now):
+        _, label, _, steps, start = self.frames.pop()
+        self.active[label] -= 1
+        if not self.active[label]:
+            # Outermost open frame of the function: count its whole extent once
+            stats = self.functions[label]
+            stats.inclusive_steps += self.steps - steps
+            stats.inclusive_time += now - start
+
+    def finish(self):
+        """Close the frames left open, e.g. when the machine stops."""
+        if not self.frames:
+            return
+        now = time.perf_counter()
+        self.charge(now)
+        while self.frames:
+            self.leave(now)
+
+    def write_report(self, write, limit=None):
+        """Write a table of the functions, most self steps first."""
+        write(f"{'steps':>12} {'incl steps':>12} {'calls':>10} {'self s':>9} {'incl s':>9}  function\n")
+        ranked = sorted(self.functions.items(), key=lambda item: -item[1].self_steps)
+        for label, stats in ranked[:limit]:
+            write(f"{stats.self_steps:>12} {stats.inclusive_steps:>12} {stats.calls:>10} "
+                  f"{stats.self_time:>9.3f} {stats.inclusive_time:>9.3f}  {label}\n")
+
+    def write_collapsed(self, write):
+        """Write one "frame;frame;... steps" line per stack, as flame graph tools read."""
+        for stack, steps in sorted(self.stacks.items()):
+            if steps:
+                write(";".join(stack) + f" {steps}\n")
@@ -0,0 +1,158 @@
+from .nodes import *
+from .cse_factory import CSEMachineFactory
+from .builtin_functions import BUILTINS
+
+class StandardizingFactory(CSEMachineFactory):
+    """Builds control structures from an AST that has not been standardized.
+
+    Each let, where, fn, @, within, rec, and and function_form node is emitted
+    as the standardized tree it stands for, in the same traversal: the AST is
+    not rewritten and the standardized tree is never built. The few parts a
+    rule introduces are passed on as tuples,
+
+        ("lambda", X, body)   X being a binding: an AST node, or a list of
+                              them for the ,(X++) of an and
+        ("gamma", rator, rand)
+        ("tau", [components])
+        ("<Y*>",)
+
+    whose fields are AST nodes or such tuples. Lambdas and deltas are
+    numbered in the order CSEMachineFactory numbers them on the standardized
+    tree, so both factories give the same machine.
+    """
+
+    def get_pre_order_traverse(self, node, name=None):
+        symbols = []
+        self.emit(node, symbols, name)
+        return symbols
+
+    def emit(self, node, symbols, name=None):
+        # name is the name a lambda is bound to, as in CSEMachineFactory
+        if type(node) is tuple:
+            label = node[0]
+            if label == "lambda":
+                symbols.append(self.get_lambda(node[1], node[2], name))
+            elif label == "gamma":
+                # gamma(lambda(f, P), E) or gamma(<Y*>, lambda(f, E)) binds f
+                rator, rand = node[1], node[2]
+                symbols.append(Gamma())
+                self.emit(rator, symbols)
+                self.emit(rand, symbols, self.get_bound_name(rator[1] if rator[0] == "lambda" else rand[1]))
+            elif label == "tau":
+                self.emit_tau(node[1], symbols)
+            else:
+                symbols.append(Ystar())
+            return
+
+        data = node.get_data()
+        children = node.get_children()
+        if data == "let" or data == "where":
+            # gamma(lambda(X, P), E)
+            equal, P = children if data == "let" else children[::-1]
+            X, E = self.get_definition(equal)
+            symbols.append(Gamma())
+            symbols.append(self.get_lambda(X, P))
+            self.emit(E, symbols, self.get_bound_name(X))
+        elif data == "lambda":
+            # lambda(V1, lambda(V2, ... E))
+            symbols.append(self.get_lambda(children[0], self.curry(children[1:-1], children[-1]), name))
+        elif data == "@":
+            # gamma(gamma(N, E1), E2)
+            symbols.append(Gamma())
+            symbols.append(Gamma())
+            self.emit(children[1], symbols)
+            self.emit(children[0], symbols)
+            self.emit(children[2], symbols)
+        elif data == "->":
+            symbols.append(self.get_delta(children[1]))  # Delta symbol
+            symbols.append(self.get_delta(children[2]))  # Delta symbol
+            symbols.append(Beta())  # Beta symbol
+            symbols.append(self.get_b(children[0]))  # B symbol
+        elif data == "tau":
+            self.emit_tau(children, symbols)
+        else:
+            symbols.append(self.get_symbol(node))
+            names = [None] * len(children)
+            if data == "gamma":
+                names[1] = self.get_function_name(children[0], children[1])
+            for child, child_name in zip(children, names):
+                self.emit(child, symbols, child_name)
+
+    def emit_tau(self, components, symbols):
+        if self.parallel and sum(map(self.is_expensive, components)) > 1:
+            symbols.append(ParallelTau([self.get_b(c) for c in components], [self.is_expensive(c) for c in components]))
+            return
+        symbols.append(Tau(len(components)))
+        for component in components:
+            self.emit(component, symbols)
+
+    def get_definition(self, node):
+        """Return (X, E) for the =(X, E) a definition standardizes to."""
+        data = node.get_data()
+        children = node.get_children()
+        if data == "function_form":
+            return children[0], self.curry(children[1:-1], children[-1])
+        elif data == "rec":
+            X, E = self.get_definition(children[0])
+            return X, ("gamma", ("<Y*>",), ("lambda", X, E))
+        elif data == "and":
+            definitions = [self.get_definition(child) for child in children]
+            return [X for X, _ in definitions], ("tau", [E for _, E in definitions])
+        elif data == "within":
+            X1, E1 = self.get_definition(children[0])
+            X2, E2 = self.get_definition(children[1])
+            return X2, ("gamma", ("lambda", X1, E2), E1)
+        return children[0], children[1]
+
+    def curry(self, variables, body):
+        for V in reversed(variables):
+            body = ("lambda", V, body)
+        return body
+
+    def get_bound_name(self, X):
+        if type(X) is list:
+            return None
+        data = X.get_data()
+        return data[12:-1] if data.startswith("<IDENTIFIER:") else None
+
+    def get_lambda(self, X, body, name=None):
+        lambda_expr = Lambda(self.i)
+        self.i += 1
+        lambda_expr.set_delta(self.get_delta(body, name))
+        lambda_expr.name = name
+        lambda_expr.position = self.get_position(X[0] if type(X) is list else X)
+        if type(X) is list:
+            identifiers = X
+        elif X.get_data() == ",":
+            identifiers = X.get_children()
+        else:
+            identifiers = [X]
+        for identifier in identifiers:
+            lambda_expr.identifiers.append(Id(identifier.get_data()[12:-1]))
+        return lambda_expr
+
+    def is_expensive(self, node):
+        # As CSEMachineFactory.is_expensive on the standardized tree: let,
+        # where and @ stand for a gamma whose rator is not a built-in
+        pending = [node]
+        while pending:
+            current = pending.pop()
+            if type(current) is tuple:
+                if current[0] == "gamma":
+                    if current[1][0] != "<Y*>":
+                        return True
+                    pending.append(current[2])
+                elif current[0] == "tau":
+                    pending.extend(current[1])
+                continue
+            data = current.get_data()
+            if data == "lambda":
+                continue
+            if data in ("let", "where", "@"):
+                return True
+            if data == "gamma":
+                rator = current.get_children()[0].get_data()
+                if rator != "<Y*>" and not (rator.startswith("<IDENTIFIER:") and BUILTINS.get(rator[12:-1])):
+                    return True
+            pending.extend(current.get_children())
+        return False
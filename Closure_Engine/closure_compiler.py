@@ -0,0 +1,402 @@
+import sys
+import threading
+from CSE_Machine.nodes import Symbol, Int, Str, Bool, Tup, Dummy, Builtin
+from CSE_Machine.builtin_functions import BUILTINS
+from CSE_Machine.operators import divide, apply_comparison, apply_logical_operation, COMPARISON_OPERATIONS
+
+# Compiled programs recurse on the Python stack, a few frames per RPAL call
+RECURSION_LIMIT = 1000000
+THREAD_STACK_SIZE = 512 * 1024 * 1024
+
+class Closure:
+    """A function value: a lambda closure or a built-in function."""
+
+    __slots__ = ("function", "identifiers", "index")
+
+    def __init__(self, function, identifiers=(), index=None):
+        self.function = function
+        self.identifiers = identifiers
+        self.index = index
+
+
+DUMMY = Dummy()
+
+def get_type_name(value):
+    return type(value).__name__
+
+def apply(rator, rand):
+    if type(rator) is Closure:
+        return rator.function(rand)
+    if type(rator) is Tup:
+        return rator.get_symbol(rand - 1)
+    raise ValueError(f"Cannot apply '{format_value(rator)}' as a function")
+
+def format_value(value):
+    pieces = []
+    write_value(value, pieces.append)
+    return "".join(pieces)
+
+def write_value(value, write, escape=False):
+    # Same printed forms as CSEMachine.render_value, iterative for nested tuples
+    pending = [value]
+    while pending:
+        value = pending.pop()
+        t = type(value)
+        if t is bool:
+            write("true" if value else "false")
+        elif t is int:
+            write(str(value))
+        elif t is str:
+            write(value.replace("\\n", "\n").replace("\\t", "\t") if escape else value)
+        elif t is Tup:
+            pending.append(Symbol(")"))
+            symbols = value.get_symbols()
+            for i in range(value.get_n() - 1, -1, -1):
+                pending.append(symbols[i])
+                if i > 0:
+                    pending.append(Symbol(", "))
+            pending.append(Symbol("("))
+        elif t is Closure:
+            if value.index is None:
+                write("[built-in function]")
+            else:
+                write(f"[lambda closure: {','.join(value.identifiers)}: {value.index}]")
+        else:
+            write(value.get_data())
+
+
+class ClosureCompiler:
+    """Compiles a standardized AST into nested Python closures.
+
+    Every node becomes a Python function of the current environment frame,
+    and each calls the functions of its children directly, so there is no
+    control stack and no per-symbol dispatch as in CSEMachine.execute.
+    Identifiers are resolved to (depth, slot) frame addresses at compile
+    time. A frame is a list [parent, value, ...] made when a lambda is
+    applied. Values are native Python ints, strs and bools, persistent Tup
+    tuples and Closure functions. Evaluation order matches the CSE machine:
+    operands and tuple components from right to left.
+    """
+
+    def __init__(self, builtins=None, output=None):
+        self.builtins = builtins if builtins is not None else BUILTINS
+        self.output = output if output is not None else sys.stdout
+        self.has_output = False
+        self.i = 1
+        self.native_builtins = self.get_native_builtins()
+
+    # Execution
+
+    def run(self, ast):
+        """Compile and run the program, returning its value."""
+        program = self.compile(ast.get_root(), [[]])
+        result = []
+        error = []
+
+        def target():
+            try:
+                result.append(program([None]))
+            except BaseException as e:
+                error.append(e)
+
+        limit = sys.getrecursionlimit()
+        stack_size = threading.stack_size()
+        sys.setrecursionlimit(RECURSION_LIMIT)
+        try:
+            threading.stack_size(THREAD_STACK_SIZE)
+            thread = threading.Thread(target=target)
+            thread.start()
+            thread.join()
+        finally:
+            threading.stack_size(stack_size)
+            sys.setrecursionlimit(limit)
+        if error:
+            raise error[0]
+        return result[0]
+
+    def write_value(self, value):
+        # Used by Print, and by registry built-ins given this compiler as machine
+        if not isinstance(value, (Closure, bool, int, str, Tup)):
+            value = self.from_symbol(value)
+        write_value(value, self.output.write, escape=True)
+        self.has_output = True
+
+    # Compilation
+
+    def compile(self, node, scope):
+        data = node.get_data()
+        children = node.get_children()
+        if data == "lambda":
+            return self.compile_lambda(node, scope)
+        elif data == "gamma":
+            if children[0].get_data() == "<Y*>":
+                return self.compile_rec(children[1], scope)
+            return self.compile_gamma(children, scope)
+        elif data == "->":
+            return self.compile_conditional(children, scope)
+        elif data == "tau":
+            return self.compile_tau(children, scope)
+        elif data in ("not", "neg"):
+            return self.compile_unary_operation(data, children, scope)
+        elif data in BINARY_OPERATIONS:
+            return self.compile_binary_operation(data, children, scope)
+        elif data.startswith("<IDENTIFIER:"):
+            return self.compile_identifier(data[12:-1], scope)
+        else:
+            value = self.get_constant(data)
+            return lambda env: value
+
+    def get_constant(self, data):
+        if data.startswith("<INTEGER:"):
+            return int(data[9:-1])
+        elif data.startswith("<STRING:"):
+            return data[9:-2]
+        elif data.startswith("<TRUE_VALUE:t"):
+            return True
+        elif data.startswith("<FALSE_VALUE:") or data.startswith("<TRUE_VALUE:f"):
+            return False
+        elif data.startswith("<NIL"):
+            return Tup()
+        elif data.startswith("<DUMMY") or data.startswith("<dummy>"):
+            return DUMMY
+        raise ValueError(f"Cannot compile node '{data}'")
+
+    def get_parameters(self, node):
+        if node.get_data() == ",":
+            return [child.get_data()[12:-1] for child in node.get_children()]
+        if node.get_data().startswith("<IDENTIFIER:"):
+            return [node.get_data()[12:-1]]
+        return []  # fn () . E
+
+    def compile_identifier(self, name, scope):
+        for depth, names in enumerate(reversed(scope)):
+            if name in names:
+                slot = len(names) - names[::-1].index(name)
+                if depth == 0:
+                    return lambda env: env[slot]
+                elif depth == 1:
+                    return lambda env: env[0][slot]
+                elif depth == 2:
+                    return lambda env: env[0][0][slot]
+
+                def get(env):
+                    for _ in range(depth):
+                        env = env[0]
+                    return env[slot]
+                return get
+        value = self.get_builtin(name)
+        return lambda env: value
+
+    def compile_lambda(self, node, scope):
+        index = self.i
+        self.i += 1
+        parameters_node, body_node = node.get_children()
+        names = self.get_parameters(parameters_node)
+        body = self.compile(body_node, scope + [names])
+        identifiers = tuple(names)
+        n = len(names)
+
+        if n == 1:
+            def make(env):
+                return Closure(lambda arg: body([env, arg]), identifiers, index)
+        elif n == 0:
+            def make(env):
+                return Closure(lambda arg: body([env]), identifiers, index)
+        else:
+            def make(env):
+                def function(arg):
+                    if type(arg) is not Tup or arg.get_n() < n:
+                        raise ValueError(f"Expected a tuple of {n} values, got {format_value(arg)}")
+                    return body([env] + arg.get_symbols()[:n])
+                return Closure(function, identifiers, index)
+        return make
+
+    def compile_rec(self, node, scope):
+        # Y* applied to lambda f. E: evaluate E in a frame where f is bound to
+        # the result of E itself, normally a lambda that refers to f
+        if node.get_data() != "lambda":
+            raise ValueError("Y* must be applied to a lambda")
+        self.i += 1
+        parameters_node, body_node = node.get_children()
+        names = self.get_parameters(parameters_node)
+        body = self.compile(body_node, scope + [names])
+        n = len(names)
+
+        def run(env):
+            frame = [env] + [None] * n
+            value = body(frame)
+            if n == 1:
+                frame[1] = value
+            else:
+                frame[1:] = value.get_symbols()[:n]
+            return value
+        return run
+
+    def compile_gamma(self, children, scope):
+        rator = self.compile(children[0], scope)
+        rand = self.compile(children[1], scope)
+
+        def run(env):
+            a = rand(env)
+            f = rator(env)
+            if type(f) is Closure:
+                return f.function(a)
+            return apply(f, a)
+        return run
+
+    def compile_conditional(self, children, scope):
+        then_branch = self.compile(children[1], scope)
+        else_branch = self.compile(children[2], scope)
+        condition = self.compile(children[0], scope)
+
+        def run(env):
+            if condition(env) is True:
+                return then_branch(env)
+            return else_branch(env)
+        return run
+
+    def compile_tau(self, children, scope):
+        components = [self.compile(child, scope) for child in children]
+        components.reverse()
+
+        def run(env):
+            values = [component(env) for component in components]
+            values.reverse()
+            return Tup(values)
+        return run
+
+    def compile_unary_operation(self, op, children, scope):
+        rand = self.compile(children[0], scope)
+        if op == "neg":
+            return lambda env: -rand(env)
+        return lambda env: not rand(env)
+
+    def compile_binary_operation(self, op, children, scope):
+        left = self.compile(children[0], scope)
+        right = self.compile(children[1], scope)
+        operation = BINARY_OPERATIONS[op]
+
+        def run(env):
+            b = right(env)
+            return operation(left(env), b)
+        return run
+
+    # Built-in functions
+
+    def get_builtin(self, name):
+        if name in self.native_builtins:
+            return self.native_builtins[name]
+        function = self.builtins.get(name)
+        if function is None:
+            # Unbound names evaluate to themselves, as in the CSE machine
+            return Symbol(name)
+        return Closure(lambda arg: self.from_symbol(function(self, self.to_symbol(arg))))
+
+    def get_native_builtins(self):
+        def rpal_print(value):
+            self.write_value(value)
+            return DUMMY
+
+        def rpal_conc(s1):
+            return Closure(lambda s2: s1 + s2)
+
+        return {
+            "Print": Closure(rpal_print),
+            "Stem": Closure(lambda s: s[0]),
+            "Stern": Closure(lambda s: s[1:]),
+            "Conc": Closure(rpal_conc),
+            "Order": Closure(lambda tup: tup.get_n()),
+            "Null": Closure(lambda value: type(value) is Tup and value.get_n() == 0),
+            "Itos": Closure(str),
+            "ItoS": Closure(str),
+            "Isinteger": Closure(lambda value: type(value) is int),
+            "Isstring": Closure(lambda value: type(value) is str),
+            "Istuple": Closure(lambda value: type(value) is Tup),
+            "Isdummy": Closure(lambda value: value is DUMMY),
+            "Istruthvalue": Closure(lambda value: type(value) is bool),
+            "Isfunction": Closure(lambda value: type(value) is Closure),
+        }
+
+    def to_symbol(self, value):
+        t = type(value)
+        if t is bool:
+            return Bool("true" if value else "false")
+        elif t is int:
+            return Int(str(value))
+        elif t is str:
+            return Str(value)
+        elif t is Tup:
+            return Tup([self.to_symbol(v) for v in value.get_symbols()])
+        elif t is Closure:
+            return Builtin("function", lambda machine, rand: self.to_symbol(value.function(self.from_symbol(rand))))
+        return value
+
+    def from_symbol(self, symbol):
+        if isinstance(symbol, Bool):
+            return symbol.get_data() == "true"
+        elif isinstance(symbol, Int):
+            return int(symbol.get_data())
+        elif isinstance(symbol, Str):
+            return symbol.get_data()
+        elif isinstance(symbol, Tup):
+            return Tup([self.from_symbol(s) for s in symbol.get_symbols()])
+        elif isinstance(symbol, Dummy):
+            return DUMMY
+        elif isinstance(symbol, Builtin):
+            return Closure(lambda arg: self.from_symbol(symbol.apply(self, self.to_symbol(arg))))
+        return symbol
+
+
+def get_operand_data(value):
+    # The data of the CSE machine symbol for value, which eq, ne, & and or see
+    t = type(value)
+    if t is bool:
+        return "true" if value else "false"
+    elif t is int:
+        return str(value)
+    elif t is str:
+        return value
+    elif t is Closure:
+        return "function" if value.index is None else "lambda"
+    return value.get_data()
+
+def get_comparison(op):
+    # Two ints, or for eq and ne two values of the same native type, are
+    # compared directly; any other operands as by the CSE machine
+    operation = COMPARISON_OPERATIONS[op]
+    native = (int, str, bool) if op in ("eq", "ne") else (int,)
+
+    def compare(a, b):
+        if type(a) is type(b) and type(a) in native:
+            return operation(a, b)
+        return apply_comparison(op, get_operand_data(a), get_operand_data(b))
+    return compare
+
+def get_logical_operation(op):
+    def operation(a, b):
+        if type(a) is bool and type(b) is bool:
+            return a and b if op == "&" else a or b
+        return apply_logical_operation(op, get_operand_data(a), get_operand_data(b))
+    return operation
+
+def aug(tup, value):
+    if type(value) is Tup:
+        return tup.extend(value.get_symbols())
+    return tup.aug(value)
+
+BINARY_OPERATIONS = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": divide,
+    "**": lambda a, b: a ** b,
+    "&": get_logical_operation("&"),
+    "or": get_logical_operation("or"),
+    "eq": get_comparison("eq"),
+    "ne": get_comparison("ne"),
+    "ls": get_comparison("ls"),
+    "le": get_comparison("le"),
+    "gr": get_comparison("gr"),
+    "ge": get_comparison("ge"),
+    "aug": aug,
+}
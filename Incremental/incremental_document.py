@@ -0,0 +1,289 @@
+from bisect import bisect_right
+from Lexical_Analyzer.lexical_analyzer import TokenType, MyToken, iter_tokens
+from Parser.parser_1 import Parser
+from Standardizer.ast import AST
+from Standardizer.ast_factory import ASTFactory
+from Standardizer.node import NodeFactory
+
+def make_node(data, children, is_standardized):
+    node = NodeFactory.get_node_with_parent(data, 0, None, children, is_standardized)
+    for child in children:
+        child.set_parent(node)
+    return node
+
+def set_child(node, i, child):
+    node.children[i] = child
+    child.set_parent(node)
+
+
+class Unit:
+    """A top-level 'let D in' header of a program, or the expression after them.
+
+    Token offsets are relative to start, the offset of the first token, so an
+    edit before the unit only moves start. The trees built from the tokens are
+    kept for as long as the unit is.
+    """
+
+    def __init__(self, start, tokens, is_header):
+        self.start = start
+        self.tokens = tokens
+        self.is_header = is_header
+        self.lex_errors = []  # (relative offset, message)
+        self.parsed = False
+        self.ast = None
+        self.standardized = None
+        self.errors = []  # (relative offset, message)
+        self.open_quote = None
+        # Nodes joining this unit's trees to those of the units after it
+        self.let_node = None
+        self.gamma_node = None
+
+    def get_key(self):
+        return tuple((token.type, token.value) for token in self.tokens)
+
+    def has_open_quote(self):
+        # The lexer only falls back to these if no later quote closes the string
+        if self.open_quote is None:
+            self.open_quote = any((token.type == TokenType.OPERATOR and "'" in token.value) or
+                                  (token.type == TokenType.STRING and token.value.endswith("\\'"))
+                                  for token in self.tokens)
+        return self.open_quote
+
+    def wrap_ast(self, rest):
+        """Return the node for 'let D in rest'."""
+        if self.let_node is None:
+            self.let_node = make_node("let", [self.ast, rest], False)
+        set_child(self.let_node, 1, rest)
+        return self.let_node
+
+    def wrap_standardized(self, rest):
+        """Return the standardized node for 'let X = E in rest', gamma(lambda(X, rest), E).
+
+        It is built around the standardized definition, which stays shared.
+        """
+        if self.gamma_node is None:
+            X, E = self.standardized.get_children()
+            lambda_node = make_node("lambda", [X, rest], True)
+            self.gamma_node = make_node("gamma", [lambda_node, E], True)
+        set_child(self.gamma_node.get_children()[0], 1, rest)
+        return self.gamma_node
+
+    def get_end(self):
+        if not self.tokens:
+            return 0
+        last = self.tokens[-1]
+        return last.offset + len(last.value)
+
+    def parse(self):
+        """Build the unit's AST subtree and its standardized copy, once."""
+        if self.parsed:
+            return
+        if self.is_header:
+            # let D in: parse D alone, an error at its end is reported at 'in'
+            tokens = self.tokens[1:-1]
+            end = self.tokens[-1].offset
+        else:
+            tokens = self.tokens
+            end = self.get_end()
+        tokens = tokens + [MyToken(TokenType.END_OF_TOKENS, "", end)]
+        parser = Parser(tokens, print_errors=False)
+        try:
+            parser.D() if self.is_header else parser.E()
+            if not parser.errors and parser.tokens[0].type != TokenType.END_OF_TOKENS:
+                parser.report_error(f"Parse error: unexpected '{parser.tokens[0].value}'")
+            elif not parser.errors and not parser.ast:
+                parser.report_error("Parse error: an expression was expected")
+        except Exception as e:
+            # The parser does not recover from every error, e.g. running off the end
+            parser.errors.append((parser.tokens[0] if parser.tokens else None, f"Parse error: {e}"))
+        ast = standardized = None
+        if not parser.errors:
+            try:
+                string_ast = parser.convert_ast_to_string_ast()
+                if not string_ast:
+                    raise ValueError("an expression was expected")
+                factory = ASTFactory()
+                ast = factory.get_abstract_syntax_tree(string_ast).get_root()
+                standardized = factory.get_abstract_syntax_tree(string_ast).get_root()
+                standardized.standardize()
+            except Exception as e:
+                # e.g. a parse that reported no error but left no tree
+                parser.errors.append((None, f"Parse error: {e}"))
+        for token, message in parser.errors:
+            self.errors.append((token.offset if token is not None else end, message))
+        if not self.errors:
+            self.ast = ast
+            self.standardized = standardized
+        self.parsed = True
+
+
+class IncrementalDocument:
+    """The front end of an RPAL program being edited, for editors.
+
+    The program is split into units: each top-level 'let D in' header, then
+    the expression that follows them. An edit re-lexes from the unit before
+    it to the first later unit whose tokens are unchanged, so only the units
+    in between are re-parsed and re-standardized. The trees returned by
+    get_ast and get_standardized_ast are made of the units' trees and are
+    relinked by later edits, so they must be copied before they are kept
+    or modified, e.g. by the optimizer or by AST.standardize.
+    """
+
+    def __init__(self, text=""):
+        self.text = ""
+        self.units = [Unit(0, [], False)]
+        self.ast = None
+        self.standardized = None
+        self.line_starts = None
+        self.edit(0, 0, text)
+
+    def get_text(self):
+        return self.text
+
+    # Editing
+
+    def edit(self, start, end, new_text):
+        """Replace text[start:end] by new_text."""
+        if not 0 <= start <= end <= len(self.text):
+            raise ValueError(f"Invalid edit range {start}:{end}")
+        delta = len(new_text) - (end - start)
+        unescapes = "\\" in self.text[start:end]
+        self.text = self.text[:start] + new_text + self.text[end:]
+        self.ast = None
+        self.standardized = None
+        self.line_starts = None
+
+        # A token ending at start may grow, so re-lex from the unit holding start - 1
+        starts = [unit.start for unit in self.units]
+        first = max(bisect_right(starts, start - 1) - 1, 0)
+        if "'" in new_text or unescapes:
+            # A quote that found no closing quote may find one now
+            first = next((k for k in range(first) if self.units[k].has_open_quote()), first)
+        position = self.units[first].start if first > 0 else 0
+        resync = {unit.start + delta: k for k, unit in enumerate(self.units) if k > first and unit.start >= end}
+
+        units, last = self.relex(position, start + len(new_text), resync)
+        # Units re-lexed to the same tokens, e.g. after a whitespace edit, keep their trees
+        reusable = {unit.get_key(): unit for unit in self.units[first:last] if unit.ast is not None}
+        for unit in units:
+            old = reusable.get(unit.get_key())
+            if old is not None and old.is_header == unit.is_header and not unit.lex_errors:
+                unit.parsed = True
+                unit.ast = old.ast
+                unit.standardized = old.standardized
+
+        rest = self.units[last:]
+        for unit in rest:
+            unit.start += delta
+        self.units = self.units[:first] + units + rest
+
+    def relex(self, position, edit_end, resync):
+        """Lex from position into new units, until a unit of resync is reached.
+
+        resync maps the new start offset of each old unit that may be kept to
+        its index. Returns the new units and the index of the first old unit
+        kept, or len(self.units) if none is.
+        """
+        units = []
+        start = None  # offset of the first token or error of the unit being lexed
+        tokens = []
+        errors = []
+        depth = 0  # lets still waiting for their 'in' in the current header
+        is_header = False
+        text = self.text
+        while True:
+            lex_errors = []
+            for token in iter_tokens(text, position, lex_errors):
+                offset = token.offset
+                if start is None:
+                    if offset >= edit_end and offset in resync:
+                        # Lexing and splitting start afresh here, as they did before
+                        return units, resync[offset]
+                    start = offset
+                    is_header = token.type == TokenType.KEYWORD and token.value == "let"
+                tokens.append(MyToken(token.type, token.value, offset - start))
+                if is_header and token.type == TokenType.KEYWORD:
+                    if token.value == "let":
+                        depth += 1
+                    elif token.value == "in":
+                        depth -= 1
+                        if depth == 0:
+                            units.append(self.make_unit(start, tokens, True, errors))
+                            start = None
+                            tokens = []
+                            errors = []
+            if not lex_errors:
+                break
+            # Report the character and carry on after it
+            offset, _, _, message = lex_errors[0]
+            if start is None:
+                start = offset
+            errors.append((offset - start, message))
+            position = offset + 1
+
+        # An unclosed header is parsed as the final expression, to report its error
+        units.append(self.make_unit(start if start is not None else len(text), tokens, False, errors))
+        return units, len(self.units)
+
+    def make_unit(self, start, tokens, is_header, errors):
+        unit = Unit(start, tokens, is_header)
+        unit.lex_errors = errors
+        return unit
+
+    # Results
+
+    def get_tokens(self):
+        """Return all tokens, with absolute offsets, lines and columns."""
+        tokens = []
+        for unit in self.units:
+            for token in unit.tokens:
+                offset = unit.start + token.offset
+                line, column = self.get_position(offset)
+                tokens.append(MyToken(token.type, token.value, offset, line, column))
+        return tokens
+
+    def get_ast(self):
+        """Return the AST of the whole program, or None if it has errors."""
+        if self.ast is None and self.parse_units():
+            rest = self.units[-1].ast
+            for unit in reversed(self.units[:-1]):
+                rest = unit.wrap_ast(rest)
+            self.ast = AST(rest)
+        return self.ast
+
+    def get_standardized_ast(self):
+        """Return the standardized AST of the whole program, or None if it has errors."""
+        if self.standardized is None and self.parse_units():
+            rest = self.units[-1].standardized
+            for unit in reversed(self.units[:-1]):
+                rest = unit.wrap_standardized(rest)
+            self.standardized = AST(rest)
+        return self.standardized
+
+    def get_diagnostics(self):
+        """Return (line, column, message) for each lexing and parsing error."""
+        diagnostics = []
+        for unit in self.units:
+            unit.parse()
+            for offset, message in unit.lex_errors + unit.errors:
+                line, column = self.get_position(unit.start + offset)
+                diagnostics.append((line, column, message))
+        return diagnostics
+
+    def parse_units(self):
+        ok = True
+        for unit in self.units:
+            unit.parse()
+            ok = ok and not unit.lex_errors and not unit.errors
+        return ok
+
+    def get_position(self, offset):
+        """Return the line and column, counting from 1, of a text offset."""
+        if self.line_starts is None:
+            self.line_starts = [0]
+            position = self.text.find("\n")
+            while position != -1:
+                self.line_starts.append(position + 1)
+                position = self.text.find("\n", position + 1)
+        line = bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
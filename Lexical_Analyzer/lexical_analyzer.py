@@ -12,12 +12,16 @@ class TokenType(Enum):
     OPERATOR = 7
 
 class MyToken:
-    def __init__(self, token_type, value):
+    def __init__(self, token_type, value, offset=None, line=None, column=None):
         # Make sure we get a valid token type
         if not isinstance(token_type, TokenType):
             raise ValueError("token_type must be an instance of TokenType enum")
         self.type = token_type
         self.value = value
+        # Where the token starts in the source text; line and column count from 1
+        self.offset = offset
+        self.line = line
+        self.column = column
 
     # Simple getters
     def get_type(self):
@@ -25,58 +29,77 @@ class MyToken:
 
     def get_value(self):
         return self.value
+
+    def get_offset(self):
+        return self.offset
+
+    def get_line(self):
+        return self.line
+
+    def get_column(self):
+        return self.column
     
     def __repr__(self):
         # Helpful for debugging
         return f"{self.type.name}:'{self.value}'"
 
-def tokenize(input_str):
-    tokens = []
-    # All the patterns we'll look for
-    patterns = {
-        'COMMENT': r'//.*',  # Comments start with // and go to end of line
-        'KEYWORD': r'(let|in|fn|where|aug|or|not|gr|ge|ls|le|eq|ne|true|false|nil|dummy|within|and|rec)\b',
-        'STRING': r'\'(?:\\\'|[^\'])*\'',  # Strings with quotes
-        'IDENTIFIER': r'[a-zA-Z][a-zA-Z0-9_]*',  # Variable names
-        'INTEGER': r'\d+',  # Numbers
-        'OPERATOR': r'[+\-*<>&.@/:=~|$\#!%^_\[\]{}"\'?]+',  # Math and other operators
-        'SPACES': r'[ \t\n]+',  # Whitespace to skip
-        'PUNCTUATION': r'[();,]'  # Special characters
-    }
+# All the patterns we'll look for, tried in this order
+TOKEN_PATTERNS = [(key, re.compile(pattern)) for key, pattern in [
+    ('COMMENT', r'//.*'),  # Comments start with // and go to end of line
+    ('KEYWORD', r'(?:let|in|fn|where|aug|or|not|gr|ge|ls|le|eq|ne|true|false|nil|dummy|within|and|rec)\b'),
+    ('STRING', r'\'(?:\\\'|[^\'])*\''),  # Strings with quotes
+    ('IDENTIFIER', r'[a-zA-Z][a-zA-Z0-9_]*'),  # Variable names
+    ('INTEGER', r'\d+'),  # Numbers
+    ('OPERATOR', r'[+\-*<>&.@/:=~|$\#!%^_\[\]{}"\'?]+'),  # Math and other operators
+    ('SPACES', r'[ \t\r\n]+'),  # Whitespace to skip
+    ('PUNCTUATION', r'[();,]'),  # Special characters
+]]
+
+# The same patterns as one alternation, so each token takes a single match
+TOKEN_REGEX = re.compile("|".join(f"(?P<{key}>{pattern.pattern})" for key, pattern in TOKEN_PATTERNS))
+TOKEN_TYPES = {key: getattr(TokenType, key) for key, _ in TOKEN_PATTERNS if hasattr(TokenType, key)}
+
+def tokenize(input_str, errors=None):
+    """Split input_str into tokens, recording where each one starts.
+
+    If a character cannot be matched, the error is appended to errors as
+    (offset, line, column, message) when a list is given, and printed
+    otherwise; tokenizing stops there.
+    """
+    return list(iter_tokens(input_str, 0, errors))
+
+def iter_tokens(input_str, position=0, errors=None):
+    """Yield the tokens of input_str from position on, as tokenize does."""
+    line = input_str.count("\n", 0, position) + 1
+    line_start = input_str.rfind("\n", 0, position) + 1
     
     # Keep going until we've processed everything
-    while input_str:
-        matched = False
-        # Try each pattern to see what matches next
-        for key, pattern in patterns.items():
-            match = re.match(pattern, input_str)
-            if match:
-                # Found a match!
-                if key == 'SPACES':
-                    # Just skip spaces
-                    input_str = input_str[match.end():]
-                    matched = True
-                    break
-                elif key == 'COMMENT':
-                    # Skip comments too
-                    input_str = input_str[match.end():]
-                    matched = True
-                    break
-                else:
-                    # Real token - add it to our list
-                    token_type = getattr(TokenType, key)
-                    tokens.append(MyToken(token_type, match.group(0)))
-                    # Move past what we just processed
-                    input_str = input_str[match.end():]
-                    matched = True
-                    break
+    length = len(input_str)
+    while position < length:
+        # The first pattern that matches here wins
+        match = TOKEN_REGEX.match(input_str, position)
+        matched = match is not None
+        if matched:
+            # Found a match! Spaces and comments are skipped
+            key = match.lastgroup
+            text = match.group()
+            if key != 'SPACES' and key != 'COMMENT':
+                # Real token - hand it out
+                yield MyToken(TOKEN_TYPES[key], text, position, line, position - line_start + 1)
+            # Move past what we just processed
+            if "\n" in text:
+                line += text.count("\n")
+                line_start = position + text.rindex("\n") + 1
+            position = match.end()
         
         # If nothing matched, we have a problem
         if not matched:
-            print(f"Error: Couldn't understand '{input_str[:20]}...'")
+            message = f"Couldn't understand '{input_str[position:position + 20]}...'"
+            if errors is None:
+                print(f"Error: {message}")
+            else:
+                errors.append((position, line, position - line_start + 1, message))
             break
-            
-    return tokens
 
 # How to use this code:
 # 
@@ -0,0 +1,105 @@
+from CSE_Machine.nodes import Int, Str, Bool, Uop, Bop
+from CSE_Machine.operators import apply_unary_operation, apply_binary_operation
+
+UNARY_OPERATORS = ("not", "neg")
+BINARY_OPERATORS = ("+", "-", "*", "/", "**", "&", "or", "eq", "ne", "ls", "le", "gr", "ge")
+
+# Larger constant powers are left to run time, in case they are never reached
+MAX_FOLDED_EXPONENT = 256
+
+class ASTOptimizer:
+    """Optimization pass over the standardized AST.
+
+    Runs between AST.standardize() and CSEMachineFactory.get_control(). It
+    folds operators whose operands are constants, using the same operator
+    semantics as the CSE machine, and replaces '->' conditionals whose test
+    is a constant by the branch that is taken.
+    """
+
+    def __init__(self):
+        self.removed = 0
+
+    def optimize(self, ast):
+        """Optimize the tree in place and return the number of nodes removed."""
+        self.removed = 0
+        if ast.get_root():
+            self.fold(ast.get_root())
+        return self.removed
+
+    def count_nodes(self, node):
+        count = 0
+        pending = [node]
+        while pending:
+            current = pending.pop()
+            count += 1
+            pending.extend(current.get_children())
+        return count
+
+    def get_constant(self, node):
+        """Return the symbol for a literal node, or None if it is not a constant."""
+        data = node.get_data()
+        if data.startswith("<INTEGER:"):
+            return Int(data[9:-1])
+        elif data.startswith("<STRING:"):
+            return Str(data, 9, len(data) - 2)
+        elif data.startswith("<TRUE_VALUE:"):
+            return Bool("true")
+        elif data.startswith("<FALSE_VALUE:"):
+            return Bool("false")
+        return None
+
+    def set_constant(self, node, symbol):
+        """Turn node into a literal for an Int or Bool symbol."""
+        self.removed += self.count_nodes(node) - 1
+        if isinstance(symbol, Int):
+            node.set_data(f"<INTEGER:{symbol.get_data()}>")
+        elif symbol.get_data() == "true":
+            node.set_data("<TRUE_VALUE:true>")
+        else:
+            node.set_data("<FALSE_VALUE:false>")
+        node.children = []
+
+    def fold_operation(self, node):
+        """Evaluate an operator over constant operands; None if it must run later."""
+        data = node.get_data()
+        operands = [self.get_constant(child) for child in node.get_children()]
+        if None in operands:
+            return None
+        try:
+            if data in UNARY_OPERATORS and len(operands) == 1:
+                result = apply_unary_operation(Uop(data), operands[0])
+            elif data in BINARY_OPERATORS and len(operands) == 2:
+                if data == "**" and abs(int(operands[1].get_data())) > MAX_FOLDED_EXPONENT:
+                    return None
+                result = apply_binary_operation(Bop(data), operands[0], operands[1])
+            else:
+                return None
+        except (ValueError, ZeroDivisionError, OverflowError):
+            # Leave the error to be raised if the expression is evaluated
+            return None
+        if isinstance(result, Int) and result.get_data().lstrip("-").isdigit():
+            return result
+        if isinstance(result, Bool) and result.get_data() in ("true", "false"):
+            return result
+        return None
+
+    def fold(self, node):
+        for child in node.get_children():
+            self.fold(child)
+
+        data = node.get_data()
+        if data in UNARY_OPERATORS or data in BINARY_OPERATORS:
+            result = self.fold_operation(node)
+            if result is not None:
+                self.set_constant(node, result)
+        elif data == "->":
+            # Statically resolve the conditional and prune the unreachable Delta
+            condition = self.get_constant(node.get_children()[0])
+            if isinstance(condition, Bool):
+                condition_node, true_node, false_node = node.get_children()
+                taken, pruned = (true_node, false_node) if condition.get_data() == "true" else (false_node, true_node)
+                self.removed += 1 + self.count_nodes(condition_node) + self.count_nodes(pruned)
+                node.set_data(taken.get_data())
+                node.children = taken.get_children()
+                for child in node.children:
+                    child.set_parent(node)
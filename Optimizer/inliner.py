@@ -0,0 +1,205 @@
+from Standardizer.node import NodeFactory
+
+# Largest lambda, in nodes, that is copied into its call sites
+MAX_INLINE_SIZE = 16
+
+class Inliner:
+    """Beta-reduction pass over the standardized AST.
+
+    After standardization 'let x = E in P' is gamma(lambda x. P, E), which
+    costs a closure, a new environment and an environment exit to run. Such
+    redexes are removed when that cannot change the result of the program:
+
+    - a binding whose variable is never referenced is dropped if E is a value
+      (a literal, identifier, lambda, rec closure or tuple of these),
+    - literal and identifier bindings are substituted at every use,
+    - a binding used once is substituted if E contains no application and the
+      use is evaluated exactly once (not under a lambda or in a '->' branch),
+    - small lambdas are copied to the call sites they can be reduced at, and
+      the binding is dropped once nothing else refers to it.
+
+    A substitution is only made where no lambda in between binds a free
+    variable of E.
+    """
+
+    def __init__(self, max_inline_size=MAX_INLINE_SIZE):
+        self.max_inline_size = max_inline_size
+        self.reduced = 0
+
+    def inline(self, ast):
+        """Reduce the tree in place and return the number of bindings removed."""
+        self.reduced = 0
+        if ast.get_root():
+            self.visit(ast.get_root())
+        return self.reduced
+
+    def visit(self, node):
+        for child in node.get_children():
+            self.visit(child)
+        self.reduce(node)
+
+    # Tree helpers
+
+    def get_identifier(self, node):
+        data = node.get_data()
+        if data.startswith("<IDENTIFIER:"):
+            return data[12:-1]
+        return None
+
+    def is_literal(self, node):
+        data = node.get_data()
+        return data.startswith("<") and not data.startswith("<IDENTIFIER:") and data != "<Y*>"
+
+    def is_lambda(self, node):
+        return node.get_data() == "lambda"
+
+    def get_parameters(self, node):
+        parameters = node.get_children()[0]
+        if parameters.get_data() == ",":
+            return [self.get_identifier(child) for child in parameters.get_children()]
+        return [self.get_identifier(parameters)]
+
+    def count_nodes(self, node):
+        count = 0
+        pending = [node]
+        while pending:
+            current = pending.pop()
+            count += 1
+            pending.extend(current.get_children())
+        return count
+
+    def copy(self, node):
+        children = [self.copy(child) for child in node.get_children()]
+        copy = NodeFactory.get_node_with_parent(node.get_data(), node.get_depth(), None, children, True)
+        for child in children:
+            child.set_parent(copy)
+        return copy
+
+    def replace(self, node, other):
+        # Make node take the place of other, keeping node's position in its parent
+        node.set_data(other.get_data())
+        node.children = other.get_children()
+        for child in node.children:
+            child.set_parent(node)
+
+    def is_value(self, node):
+        """Whether evaluating node cannot fail or have an effect."""
+        if self.is_literal(node) or self.get_identifier(node) is not None or self.is_lambda(node):
+            return True
+        children = node.get_children()
+        if node.get_data() == "tau":
+            return all(self.is_value(child) for child in children)
+        if node.get_data() == "gamma":
+            return children[0].get_data() == "<Y*>" and self.is_lambda(children[1])
+        return False
+
+    def has_application(self, node):
+        """Whether evaluating node may apply a function (lambda bodies excluded)."""
+        pending = [node]
+        while pending:
+            current = pending.pop()
+            if self.is_lambda(current):
+                continue
+            if current.get_data() == "gamma" and not self.is_value(current):
+                return True
+            pending.extend(current.get_children())
+        return False
+
+    def get_free_variables(self, node):
+        free = set()
+        pending = [(node, frozenset())]
+        while pending:
+            current, bound = pending.pop()
+            name = self.get_identifier(current)
+            if name is not None:
+                if name not in bound:
+                    free.add(name)
+            elif self.is_lambda(current):
+                body_bound = bound | set(self.get_parameters(current))
+                pending.append((current.get_children()[1], body_bound))
+            else:
+                pending.extend((child, bound) for child in current.get_children())
+        return free
+
+    def find_uses(self, node, name):
+        """Return (use, path, bound, strict) for each free use of name in node.
+
+        path lists the ancestors of the use from node down to its parent, bound
+        holds the names bound by lambdas on that path, and strict tells whether
+        the use is evaluated exactly once whenever node is.
+        """
+        uses = []
+        pending = [(node, [], frozenset(), True)]
+        while pending:
+            current, path, bound, strict = pending.pop()
+            if self.get_identifier(current) == name:
+                uses.append((current, path, bound, strict))
+            elif self.is_lambda(current):
+                parameters = self.get_parameters(current)
+                if name not in parameters:
+                    body = current.get_children()[1]
+                    pending.append((body, path + [current], bound | set(parameters), False))
+            elif current.get_data() == "->":
+                children = current.get_children()
+                pending.append((children[0], path + [current], bound, strict))
+                pending.extend((child, path + [current], bound, False) for child in children[1:])
+            else:
+                pending.extend((child, path + [current], bound, strict) for child in current.get_children())
+        return uses
+
+    # Reduction
+
+    def reduce(self, node):
+        """Remove the redex at node if it is safe to; return whether it was removed."""
+        children = node.get_children()
+        if node.get_data() != "gamma" or not self.is_lambda(children[0]):
+            return False
+        lambda_node, E = children
+        X, P = lambda_node.get_children()
+        name = self.get_identifier(X)
+        if name is None:
+            return False
+
+        uses = self.find_uses(P, name)
+        free = self.get_free_variables(E)
+        capture_free = name not in free and all(not (bound & free) for _, _, bound, _ in uses)
+
+        if self.is_lambda(E) and uses and capture_free and self.count_nodes(E) <= self.max_inline_size:
+            self.inline_calls(E, uses)
+            uses = self.find_uses(P, name)
+
+        if not uses and self.is_value(E):
+            pass
+        elif not capture_free:
+            return False
+        elif self.is_literal(E) or self.get_identifier(E) is not None:
+            for use, _, _, _ in uses:
+                self.replace(use, self.copy(E))
+        elif len(uses) == 1 and uses[0][3] and not self.has_application(E):
+            self.replace(uses[0][0], E)
+        else:
+            return False
+
+        self.replace(node, P)
+        self.reduced += 1
+        return True
+
+    def inline_calls(self, function, uses):
+        """Copy function into each call site where the resulting redex reduces."""
+        for use, path, _, _ in uses:
+            if not path or path[-1].get_data() != "gamma" or path[-1].get_children()[0] is not use:
+                continue
+            original = use.get_data()
+            self.replace(use, self.copy(function))
+            if not self.reduce(path[-1]):
+                # Leave the call as it was, a closure would be built for nothing
+                use.set_data(original)
+                use.children = []
+                continue
+            # A curried call may have exposed another redex above the call site
+            for i in range(len(path) - 2, -1, -1):
+                parent, child = path[i], path[i + 1]
+                if parent.get_data() != "gamma" or parent.get_children()[0] is not child:
+                    break
+                if not self.reduce(parent):
+                    break
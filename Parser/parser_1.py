@@ -1,3 +1,4 @@
+from collections import deque
 from enum import Enum
 from Lexical_Analyzer.lexical_analyzer import TokenType, MyToken
 
@@ -37,16 +38,55 @@ class NodeType(Enum):
 
 
 class Node:
-    def __init__(self, node_type, value, children):
+    def __init__(self, node_type, value, children, position=None):
         self.type = node_type
         self.value = value
         self.no_of_children = children
+        # (line, column) of the token, for identifiers
+        self.position = position
+
+class ParseError(Exception):
+    # Raised by a Parser made with stop_at_first_error
+    def __init__(self, message, token):
+        super().__init__(message)
+        self.token = token
+
+
+class NodeSink:
+    # Stands in for the AST list when only the syntax is checked
+    def append(self, node):
+        pass
+
 
 class Parser:
-    def __init__(self, tokens):
-        self.tokens = tokens
-        self.ast = []
+    def __init__(self, tokens, print_errors=True, ast=None, stop_at_first_error=False):
+        # A deque, since tokens are consumed from the front
+        self.tokens = deque(tokens)
+        # Nodes are appended to ast in postfix order: a list by default, a
+        # NodeSink to only check the syntax, or a CompactAST to build it
+        self.ast = ast if ast is not None else []
         self.string_ast = []
+        # The position of each string_ast node, None if it has none
+        self.string_ast_positions = []
+        # (token, message) for each parse error, token being where it was found
+        self.errors = []
+        self.print_errors = print_errors
+        self.stop_at_first_error = stop_at_first_error
+
+    def report_error(self, message):
+        token = self.tokens[0] if self.tokens else None
+        if self.stop_at_first_error:
+            raise ParseError(message, token)
+        self.errors.append((token, message))
+        if self.print_errors:
+            print(message)
+
+    def get_position(self):
+        # (line, column) of the next token, None if it was not lexed from a file
+        token = self.tokens[0]
+        if token.get_line() is None:
+            return None
+        return token.get_line(), token.get_column()
 
     def parse(self):
         self.tokens.append(MyToken(TokenType.END_OF_TOKENS, ""))  # Add an End Of Tokens marker
@@ -54,10 +94,11 @@ class Parser:
         if self.tokens[0].type == TokenType.END_OF_TOKENS:
             return self.ast
         else:
-            print("Parsing Unsuccessful!...........")
-            print("REMAINIG UNPARSED TOKENS:")
-            for token in self.tokens:
-                print("<" + str(token.type) + ", " + token.value + ">")
+            self.report_error("Parsing Unsuccessful!...........")
+            if self.print_errors:
+                print("REMAINIG UNPARSED TOKENS:")
+                for token in self.tokens:
+                    print("<" + str(token.type) + ", " + token.value + ">")
             return None
 
     def convert_ast_to_string_ast(self):
@@ -90,9 +131,11 @@ class Parser:
 
         # Reverse the list
         self.string_ast.reverse()
+        self.string_ast_positions.reverse()
         return self.string_ast
 
     def add_strings(self, dots, node):
+        self.string_ast_positions.append(node.position)
         if node.type in [NodeType.identifier, NodeType.integer, NodeType.string, NodeType.true_value,
                          NodeType.false_value, NodeType.nil, NodeType.dummy]:
             self.string_ast.append(dots + "<" + node.type.name.upper() + ":" + node.value + ">")
@@ -115,32 +158,32 @@ class Parser:
                     # print('Entering if block in E...')
                     if token.value == "let":
                         # print('Entering let block...')
-                        self.tokens.pop(0)  # Remove "let"
+                        self.tokens.popleft()  # Remove "let"
                         self.D()
                         if self.tokens[0].value != "in":
-                            print("Parse error at E : 'in' Expected")
-                        self.tokens.pop(0)  # Remove "in"
+                            self.report_error("Parse error at E : 'in' Expected")
+                        self.tokens.popleft()  # Remove "in"
                         self.E()
                         self.ast.append(Node(NodeType.let, "let", 2))
                     else:
-                        self.tokens.pop(0)  # Remove "fn"
+                        self.tokens.popleft()  # Remove "fn"
                         n = 0
                         while self.tokens and (self.tokens[0].type == TokenType.IDENTIFIER or self.tokens[0].value == "("):
                             self.Vb()
                             n += 1
                         if self.tokens and self.tokens[0].value != ".":
-                            print("Parse error at E : '.' Expected")
+                            self.report_error("Parse error at E : '.' Expected")
                         if self.tokens:
-                            self.tokens.pop(0)  # Remove "."
+                            self.tokens.popleft()  # Remove "."
                             self.E()
                             self.ast.append(Node(NodeType.lambda_expr, "lambda", n + 1))
                 else:
                     # print('Entering else block...')
                     self.Ew()
             else:
-                print("Invalid token format.")
+                self.report_error("Invalid token format.")
         else:
-            print("Tokens list is empty.")
+            self.report_error("Tokens list is empty.")
 
 
     # Ew	->T 'where' Dr			=> 'where'
@@ -149,7 +192,7 @@ class Parser:
     def Ew(self):
         self.T()
         if self.tokens[0].value == "where":
-            self.tokens.pop(0)  # Remove "where"
+            self.tokens.popleft()  # Remove "where"
             self.Dr()
             self.ast.append(Node(NodeType.where, "where", 2))
 
@@ -162,7 +205,7 @@ class Parser:
         self.Ta()
         n = 1
         while self.tokens[0].value == ",":
-            self.tokens.pop(0)  # Remove comma(,)
+            self.tokens.popleft()  # Remove comma(,)
             self.Ta()
             n += 1
         if n > 1:
@@ -177,7 +220,7 @@ class Parser:
     def Ta(self):
         self.Tc()
         while self.tokens[0].value == "aug":
-            self.tokens.pop(0)  # Remove "aug"
+            self.tokens.popleft()  # Remove "aug"
             self.Tc()
             self.ast.append(Node(NodeType.aug, "aug", 2))
 
@@ -188,12 +231,12 @@ class Parser:
     def Tc(self):
         self.B()
         if self.tokens[0].value == "->":
-            self.tokens.pop(0)  # Remove '->'
+            self.tokens.popleft()  # Remove '->'
             self.Tc()
             if self.tokens[0].value != "|":
-                print("Parse error at Tc: conditional '|' expected")
+                self.report_error("Parse error at Tc: conditional '|' expected")
                 # return
-            self.tokens.pop(0)  # Remove '|'
+            self.tokens.popleft()  # Remove '|'
             self.Tc()
             self.ast.append(Node(NodeType.conditional, "->", 3))
 
@@ -207,7 +250,7 @@ class Parser:
     def B(self):
         self.Bt()
         while self.tokens[0].value == "or":
-            self.tokens.pop(0)  # Remove 'or'
+            self.tokens.popleft()  # Remove 'or'
             self.Bt()
             self.ast.append(Node(NodeType.op_or, "or", 2))
 
@@ -220,7 +263,7 @@ class Parser:
     def Bt(self):
         self.Bs()
         while self.tokens[0].value == "&":
-            self.tokens.pop(0)  # Remove '&'
+            self.tokens.popleft()  # Remove '&'
             self.Bs()
             self.ast.append(Node(NodeType.op_and, "&", 2))
 
@@ -229,7 +272,7 @@ class Parser:
 
     def Bs(self):
         if self.tokens[0].value == "not":
-            self.tokens.pop(0)  # Remove 'not'
+            self.tokens.popleft()  # Remove 'not'
             self.Bp()
             self.ast.append(Node(NodeType.op_not, "not", 1))
         else:
@@ -248,7 +291,7 @@ class Parser:
         self.A()
         token = self.tokens[0]
         if token.value in [">", ">=", "<", "<=", "gr", "ge", "ls", "le", "eq", "ne"]:
-            self.tokens.pop(0)
+            self.tokens.popleft()
             self.A()
             if token.value == ">":
                 self.ast.append(Node(NodeType.op_compare, "gr", 2))
@@ -271,10 +314,10 @@ class Parser:
 
     def A(self):
         if self.tokens[0].value == "+":
-            self.tokens.pop(0)  # Remove unary plus
+            self.tokens.popleft()  # Remove unary plus
             self.At()
         elif self.tokens[0].value == "-":
-            self.tokens.pop(0)  # Remove unary minus
+            self.tokens.popleft()  # Remove unary minus
             self.At()
             self.ast.append(Node(NodeType.op_neg, "neg", 1))
         else:
@@ -282,7 +325,7 @@ class Parser:
 
         while self.tokens[0].value in {"+", "-"}:
             current_token = self.tokens[0]  # Save present token
-            self.tokens.pop(0)  # Remove plus or minus operators
+            self.tokens.popleft()  # Remove plus or minus operators
             self.At()
             if current_token.value == "+":
                 self.ast.append(Node(NodeType.op_plus, "+", 2))
@@ -300,7 +343,7 @@ class Parser:
         self.Af()
         while self.tokens[0].value in {"*", "/"}:
             current_token = self.tokens[0]  # Save present token
-            self.tokens.pop(0)  # Remove multiply or divide operators
+            self.tokens.popleft()  # Remove multiply or divide operators
             self.Af()
             if current_token.value == "*":
                 self.ast.append(Node(NodeType.op_mul, "*", 2))
@@ -317,7 +360,7 @@ class Parser:
     def Af(self):
         self.Ap()
         if self.tokens[0].value == "**":
-            self.tokens.pop(0)  # Remove power operator
+            self.tokens.popleft()  # Remove power operator
             self.Af()
             self.ast.append(Node(NodeType.op_pow, "**", 2))
 
@@ -330,15 +373,15 @@ class Parser:
     def Ap(self):
         self.R()
         while self.tokens[0].value == "@":
-            self.tokens.pop(0)  # Remove @ operator
+            self.tokens.popleft()  # Remove @ operator
             
             if self.tokens[0].type != TokenType.IDENTIFIER:
-                print("Parsing error at Ap: IDENTIFIER EXPECTED")
+                self.report_error("Parsing error at Ap: IDENTIFIER EXPECTED")
                 # Handle parsing error here
                 return
             
-            self.ast.append(Node(NodeType.identifier, self.tokens[0].value, 0))
-            self.tokens.pop(0)  # Remove IDENTIFIER
+            self.ast.append(Node(NodeType.identifier, self.tokens[0].value, 0, self.get_position()))
+            self.tokens.popleft()  # Remove IDENTIFIER
             
             self.R()
             self.ast.append(Node(NodeType.at, "@", 3))
@@ -376,53 +419,52 @@ class Parser:
         # print(f"Processing token: {token_type}, {token_value}")
         
         if token_type == TokenType.IDENTIFIER:
-            self.ast.append(Node(NodeType.identifier, token_value, 0))
+            self.ast.append(Node(NodeType.identifier, token_value, 0, self.get_position()))
             # print(token_value)
-            self.tokens.pop(0)
+            self.tokens.popleft()
         elif token_type == TokenType.INTEGER:
             self.ast.append(Node(NodeType.integer, token_value, 0))
             # print(token_value)
-            self.tokens.pop(0)
+            self.tokens.popleft()
         elif token_type == TokenType.STRING:
             self.ast.append(Node(NodeType.string, token_value, 0))
             # print(token_value)
-            self.tokens.pop(0)
+            self.tokens.popleft()
         elif token_type == TokenType.KEYWORD:
             if token_value == "true":
                 self.ast.append(Node(NodeType.true_value, token_value, 0))
                 # print(token_value)
-                self.tokens.pop(0)
+                self.tokens.popleft()
             elif token_value == "false":
                 self.ast.append(Node(NodeType.false_value, token_value, 0))
                 # print(token_value)
-                self.tokens.pop(0)
+                self.tokens.popleft()
             elif token_value == "nil":
                 self.ast.append(Node(NodeType.nil, token_value, 0))
                 # print(token_value)
-                self.tokens.pop(0)
+                self.tokens.popleft()
             elif token_value == "dummy":
                 self.ast.append(Node(NodeType.dummy, token_value, 0))
                 # print(token_value)
-                self.tokens.pop(0)
+                self.tokens.popleft()
             else:
-                print("Parse Error at Rn: Unexpected KEYWORD")
+                self.report_error("Parse Error at Rn: Unexpected KEYWORD")
         elif token_type == TokenType.PUNCTUATION:
             if token_value == "(":
                 # # print(token_value)
-                self.tokens.pop(0)  # Remove '('
+                self.tokens.popleft()  # Remove '('
                 
                 self.E()
                 
                 if self.tokens[0].value != ")":
-                    print("Parsing error at Rn: Expected a matching ')'")
+                    self.report_error("Parsing error at Rn: Expected a matching ')'")
                     # return
                 # # print(tokens[0].value)
-                self.tokens.pop(0)  # Remove ')'
+                self.tokens.popleft()  # Remove ')'
             else:
-                print("Parsing error at Rn: Unexpected PUNCTUATION")
+                self.report_error("Parsing error at Rn: Unexpected PUNCTUATION")
         else:
-            print(token_type, token_value)
-            print("Parsing error at Rn: Expected a Rn, but got different")
+            self.report_error(f"Parsing error at Rn: Expected a Rn, but got {token_type} {token_value}")
 
     # Definitions
 
@@ -433,7 +475,7 @@ class Parser:
         self.Da()
         if self.tokens[0].value == "within":
             # # print(tokens[0].value)
-            self.tokens.pop(0)  # Remove 'within'
+            self.tokens.popleft()  # Remove 'within'
             self.D()
             self.ast.append(Node(NodeType.within, "within", 2))
 
@@ -445,7 +487,7 @@ class Parser:
         n = 1
         while self.tokens[0].value == "and":
             # # print(tokens[0].value)
-            self.tokens.pop(0)
+            self.tokens.popleft()
             self.Dr()
             n += 1
         if n > 1:
@@ -458,7 +500,7 @@ class Parser:
         is_rec = False
         if self.tokens[0].value == "rec":
             # # print(tokens[0].value)
-            self.tokens.pop(0)
+            self.tokens.popleft()
             is_rec = True
         self.Db()
         if is_rec:
@@ -471,48 +513,48 @@ class Parser:
     def Db(self): 
         if self.tokens[0].type == TokenType.PUNCTUATION and self.tokens[0].value == "(":
             # print(self.tokens[0].value)
-            self.tokens.pop(0)
+            self.tokens.popleft()
             self.D()
             if self.tokens[0].value != ")":
-                print("Parsing error at Db #1")
+                self.report_error("Parsing error at Db #1")
                 # return
             # print(tokens[0].value)
-            self.tokens.pop(0)
+            self.tokens.popleft()
         elif self.tokens[0].type == TokenType.IDENTIFIER:
             # print(self.tokens[0].value)
             if self.tokens[1].value == "(" or self.tokens[1].type == TokenType.IDENTIFIER:
                 # Expect a fcn_form
-                self.ast.append(Node(NodeType.identifier, self.tokens[0].value, 0))
+                self.ast.append(Node(NodeType.identifier, self.tokens[0].value, 0, self.get_position()))
                 # print(self.tokens[0].value)
-                self.tokens.pop(0)  # Remove ID
+                self.tokens.popleft()  # Remove ID
 
                 n = 1  # Identifier child
                 while self.tokens[0].type == TokenType.IDENTIFIER or self.tokens[0].value == "(":
                     self.Vb()
                     n += 1
                 if self.tokens[0].value != "=":
-                    print("Parsing error at Db #2")
+                    self.report_error("Parsing error at Db #2")
                     # return
                 # print(tokens[0].value)
-                self.tokens.pop(0)
+                self.tokens.popleft()
                 self.E()
 
                 self.ast.append(Node(NodeType.fcn_form, "fcn_form", n+1))
             elif self.tokens[1].value == "=":
-                self.ast.append(Node(NodeType.identifier, self.tokens[0].value, 0))
+                self.ast.append(Node(NodeType.identifier, self.tokens[0].value, 0, self.get_position()))
                 # print(tokens[0].value)
-                self.tokens.pop(0)  # Remove identifier
+                self.tokens.popleft()  # Remove identifier
                 # print(tokens[0].value)
-                self.tokens.pop(0)  # Remove equal
+                self.tokens.popleft()  # Remove equal
                 self.E()
                 self.ast.append(Node(NodeType.equal, "=", 2))
             elif self.tokens[1].value == ",":
                 self.Vl()
                 if self.tokens[0].value != "=":
-                    print("Parsing error at Db")
+                    self.report_error("Parsing error at Db")
                     # return
                 # print(tokens[0].value)
-                self.tokens.pop(0)
+                self.tokens.popleft()
                 self.E()
 
                 self.ast.append(Node(NodeType.equal, "=", 2))
@@ -526,7 +568,7 @@ class Parser:
     def Vb(self):
         if self.tokens[0].type == TokenType.PUNCTUATION and self.tokens[0].value == "(":
             # print(self.tokens[0].value)
-            self.tokens.pop(0)
+            self.tokens.popleft()
             isVl = False
 
             if self.tokens[0].type == TokenType.IDENTIFIER:
@@ -535,16 +577,16 @@ class Parser:
                 isVl = True
             
             if self.tokens[0].value != ")":
-                print("Parse error unmatch )")
+                self.report_error("Parse error unmatch )")
                 # return
             # print(self.tokens[0].value)
-            self.tokens.pop(0)
+            self.tokens.popleft()
             if not isVl:
                 self.ast.append(Node(NodeType.empty_params, "()", 0))
         elif self.tokens[0].type == TokenType.IDENTIFIER:
-            self.ast.append(Node(NodeType.identifier, self.tokens[0].value, 0))
+            self.ast.append(Node(NodeType.identifier, self.tokens[0].value, 0, self.get_position()))
             # print(tokens[0].value)
-            self.tokens.pop(0)
+            self.tokens.popleft()
 
     # Vl -> '<IDENTIFIER>' list ',' => ','?;
             
@@ -553,13 +595,13 @@ class Parser:
         while True:
             # print(self.tokens[0].value)
             if n > 0:
-                self.tokens.pop(0)
+                self.tokens.popleft()
             if not self.tokens[0].type == TokenType.IDENTIFIER:
-                print("Parse error: an identifier was expected")
+                self.report_error("Parse error: an identifier was expected")
             # print(self.tokens[0].value)
-            self.ast.append(Node(NodeType.identifier, self.tokens[0].value, 0))
+            self.ast.append(Node(NodeType.identifier, self.tokens[0].value, 0, self.get_position()))
             
-            self.tokens.pop(0)
+            self.tokens.popleft()
             n += 1
             if not self.tokens[0].value == ",":
                 break
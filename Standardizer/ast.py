@@ -1,3 +1,5 @@
+from .ast_dumper import dump_ast
+
 class AST:
     def __init__(self, root=None):
         self.root = root
@@ -22,12 +24,12 @@ class AST:
         for child in node.get_children() if hasattr(node, 'get_children') else node.children:
             self.pre_order_traverse(child, level + 1)
 
-    def print_ast(self):
+    def print_ast(self, format="text", stream=None):
         if not self.root:
             print("Empty tree")
             return
             
-        self.pre_order_traverse(self.get_root(), 0)
+        dump_ast(self.get_root(), format, stream)
         
     def tree_depth(self):
         def max_depth(node, current=0):
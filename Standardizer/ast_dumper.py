@@ -0,0 +1,60 @@
+import sys
+from CSE_Machine.output_buffer import OutputBuffer
+
+# Dumpers for -ast and -sast. Both walk the tree iteratively and hand their
+# output to one write function, so deep trees do not hit the recursion limit
+# and a large dump is not a write call per node. They read get_data and
+# get_children only, so they dump Node trees and CompactAST views alike.
+
+FORMATS = ("text", "json")
+
+def write_text(root, write):
+    """Write the dotted pre-order listing of the tree, one node per line."""
+    pending = [(root, 0)]
+    while pending:
+        node, depth = pending.pop()
+        write("." * depth + node.get_data() + "\n")
+        pending.extend((child, depth + 1) for child in reversed(node.get_children()))
+
+def write_json(root, write):
+    """Write the tree as one nested JSON object followed by a newline.
+
+    Leaves such as <IDENTIFIER:x> become {"type": "IDENTIFIER", "value": "x"},
+    the value being the token text; other nodes become
+    {"type": label, "children": [...]}, with no children key for leaves
+    without a value such as <Y*> and ().
+    """
+    import json
+    # Nodes still to write, and the literal text that closes or separates them
+    pending = [root]
+    while pending:
+        node = pending.pop()
+        if type(node) is str:
+            write(node)
+            continue
+        data = node.get_data()
+        children = node.get_children()
+        if data.startswith("<") and data.endswith(">") and ":" in data:
+            node_type, value = data[1:-1].split(":", 1)
+            write('{"type": ' + json.dumps(node_type) + ', "value": ' + json.dumps(value) + "}")
+        elif not children:
+            write('{"type": ' + json.dumps(data) + "}")
+        else:
+            write('{"type": ' + json.dumps(data) + ', "children": [')
+            pending.append("]}")
+            for i in range(len(children) - 1, -1, -1):
+                pending.append(children[i])
+                if i:
+                    pending.append(", ")
+    write("\n")
+
+def dump_ast(root, format="text", stream=None):
+    """Write the tree under root to stream, sys.stdout by default, through an OutputBuffer."""
+    output = OutputBuffer(stream if stream is not None else sys.stdout)
+    try:
+        if format == "json":
+            write_json(root, output.write)
+        else:
+            write_text(root, output.write)
+    finally:
+        output.flush()
@@ -6,13 +6,16 @@ class ASTFactory:
     def __init__(self):
         pass
 
-    def get_abstract_syntax_tree(self, data):
+    def get_abstract_syntax_tree(self, data, positions=None):
+        # positions, if given, holds the source position of each node in data
         root = NodeFactory.get_node(data[0], 0)
+        if positions:
+            root.position = positions[0]
         previous = root
         depth = 0
 
         # Process each string representation after root
-        for node_str in data[1:]:
+        for k, node_str in enumerate(data[1:], 1):
             dot_count = 0
             for char in node_str:
                 if char != '.':
@@ -22,6 +25,8 @@ class ASTFactory:
             # Extract the actual node data (after dots)
             node_data = node_str[dot_count:]
             current = NodeFactory.get_node(node_data, dot_count)
+            if positions:
+                current.position = positions[k]
 
             # Determine where to attach the new node
             if depth < dot_count:
@@ -0,0 +1,245 @@
+from array import array
+from Parser.parser_1 import NodeType
+from .ast_dumper import dump_ast
+
+# Parser node types printed as "<TYPE:value>" leaves
+LEAF_TYPES = (NodeType.identifier, NodeType.integer, NodeType.string, NodeType.true_value,
+              NodeType.false_value, NodeType.nil, NodeType.dummy)
+
+class CompactAST:
+    """An abstract syntax tree stored as parallel array columns.
+
+    Node i has the label kinds[kind[i]], e.g. "let", "gamma" or "IDENTIFIER",
+    the token text values[value[i]] for leaves (value[i] is -1 otherwise),
+    its first child and its next sibling (-1 for none). Labels and token
+    texts are interned, so a node costs a few array entries instead of a
+    Parser.Node and a Standardizer.node.Node. Identifiers also keep the line
+    and column of their token (0 for none).
+
+    The tree is built by passing it to the Parser as the list it appends
+    nodes to, and standardized in place by standardize. CompactNode views
+    give the get_data/get_children interface of Standardizer.node.Node, so
+    CSEMachineFactory and the closure compiler read it as they read an AST.
+    """
+
+    def __init__(self):
+        self.kind = array("H")
+        self.value = array("i")
+        self.first_child = array("i")
+        self.next_sibling = array("i")
+        self.line = array("i")
+        self.column = array("i")
+        self.kinds = []
+        self.kind_index = {}
+        self.values = []
+        self.value_index = {}
+        self.pending = []  # built subtrees not yet attached to a parent
+        self.root = -1
+        self.is_standardized = False
+
+    # Building from the parser's postfix output
+
+    def append(self, node):
+        """Add a Parser.Node whose children are the last subtrees added."""
+        if node.type in LEAF_TYPES:
+            i = self.add_node(node.type.name.upper(), node.value)
+            if node.position is not None:
+                self.line[i], self.column[i] = node.position
+        elif node.type == NodeType.fcn_form:
+            i = self.add_node("function_form")
+        else:
+            i = self.add_node(node.value)
+        n = node.no_of_children
+        if n:
+            self.set_children(i, self.pending[-n:])
+            del self.pending[-n:]
+        self.pending.append(i)
+        self.root = i
+
+    def __bool__(self):
+        return self.root != -1
+
+    def add_node(self, label, text=None):
+        kind = self.kind_index.get(label)
+        if kind is None:
+            kind = self.kind_index[label] = len(self.kinds)
+            self.kinds.append(label)
+        value = -1
+        if text is not None:
+            value = self.value_index.get(text)
+            if value is None:
+                value = self.value_index[text] = len(self.values)
+                self.values.append(text)
+        self.kind.append(kind)
+        self.value.append(value)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        self.line.append(0)
+        self.column.append(0)
+        return len(self.kind) - 1
+
+    def copy_node(self, i):
+        # A node with the same label and the same (shared) children
+        j = self.add_node(self.get_label(i))
+        self.value[j] = self.value[i]
+        self.first_child[j] = self.first_child[i]
+        self.line[j] = self.line[i]
+        self.column[j] = self.column[i]
+        return j
+
+    # Access
+
+    def get_root(self):
+        return CompactNode(self, self.root)
+
+    def get_label(self, i):
+        return self.kinds[self.kind[i]]
+
+    def get_data(self, i):
+        """Return the label of node i as Standardizer.node.Node spells it."""
+        label = self.kinds[self.kind[i]]
+        if self.value[i] == -1:
+            return label
+        return f"<{label}:{self.values[self.value[i]]}>"
+
+    def get_children(self, i):
+        children = []
+        child = self.first_child[i]
+        while child != -1:
+            children.append(child)
+            child = self.next_sibling[child]
+        return children
+
+    def set_children(self, i, children):
+        self.first_child[i] = children[0] if children else -1
+        for a, b in zip(children, children[1:]):
+            self.next_sibling[a] = b
+        if children:
+            self.next_sibling[children[-1]] = -1
+
+    def set_label(self, i, label):
+        kind = self.kind_index.get(label)
+        if kind is None:
+            kind = self.kind_index[label] = len(self.kinds)
+            self.kinds.append(label)
+        self.kind[i] = kind
+
+    def print_ast(self, format="text", stream=None):
+        """Print the tree as AST.print_ast does."""
+        if self.root == -1:
+            print("Empty tree")
+            return
+        dump_ast(self.get_root(), format, stream)
+
+    # Standardization, the rules of Standardizer.node.Node.standardize
+
+    def standardize(self):
+        if self.is_standardized or self.root == -1:
+            return
+        # Children before parents; each rule rewrites node i in place, so
+        # the link from its parent stays valid
+        order = []
+        pending = [self.root]
+        while pending:
+            i = pending.pop()
+            order.append(i)
+            pending.extend(self.get_children(i))
+        for i in reversed(order):
+            self.standardize_node(i)
+        self.is_standardized = True
+
+    def standardize_node(self, i):
+        label = self.get_label(i)
+        if label == "where":
+            # where(P, =(X, E)) is let(=(X, E), P)
+            P, equal = self.get_children(i)
+            self.set_children(i, [equal, P])
+            label = "let"
+        if label == "let":
+            # let(=(X, E), P) => gamma(lambda(X, P), E)
+            equal, P = self.get_children(i)
+            X, E = self.get_children(equal)
+            self.set_label(equal, "lambda")
+            self.set_children(equal, [X, P])
+            self.set_label(i, "gamma")
+            self.set_children(i, [equal, E])
+        elif label == "function_form":
+            # function_form(P, V+, E) => =(P, lambda(V1, ... lambda(Vn, E)))
+            children = self.get_children(i)
+            self.set_label(i, "=")
+            self.set_children(i, [children[0], self.curry(children[1:-1], children[-1])])
+        elif label == "lambda":
+            # lambda(V++, E) => lambda(V1, lambda(V2, ... E))
+            children = self.get_children(i)
+            if len(children) > 2:
+                self.set_children(i, [children[0], self.curry(children[1:-1], children[-1])])
+        elif label == "within":
+            # within(=(X1, E1), =(X2, E2)) => =(X2, gamma(lambda(X1, E2), E1))
+            first, second = self.get_children(i)
+            X1, E1 = self.get_children(first)
+            X2, E2 = self.get_children(second)
+            lambda_node = self.add_node("lambda")
+            self.set_children(lambda_node, [X1, E2])
+            gamma = self.add_node("gamma")
+            self.set_children(gamma, [lambda_node, E1])
+            self.set_label(i, "=")
+            self.set_children(i, [X2, gamma])
+        elif label == "@":
+            # @(E1, N, E2) => gamma(gamma(N, E1), E2)
+            E1, N, E2 = self.get_children(i)
+            gamma = self.add_node("gamma")
+            self.set_children(gamma, [N, E1])
+            self.set_label(i, "gamma")
+            self.set_children(i, [gamma, E2])
+        elif label == "and":
+            # and(=(X, E)++) => =(,(X++), tau(E++))
+            comma = self.add_node(",")
+            tau = self.add_node("tau")
+            equals = self.get_children(i)
+            pairs = [self.get_children(equal) for equal in equals]
+            self.set_children(comma, [X for X, _ in pairs])
+            self.set_children(tau, [E for _, E in pairs])
+            self.set_label(i, "=")
+            self.set_children(i, [comma, tau])
+        elif label == "rec":
+            # rec(=(X, E)) => =(X, gamma(<Y*>, lambda(X, E)))
+            X, E = self.get_children(self.get_children(i)[0])
+            F = self.copy_node(X)
+            lambda_node = self.add_node("lambda")
+            self.set_children(lambda_node, [X, E])
+            gamma = self.add_node("gamma")
+            self.set_children(gamma, [self.add_node("<Y*>"), lambda_node])
+            self.set_label(i, "=")
+            self.set_children(i, [F, gamma])
+
+    def curry(self, variables, body):
+        # lambda(V1, lambda(V2, ... lambda(Vn, body))) for the new lambdas
+        for V in reversed(variables):
+            lambda_node = self.add_node("lambda")
+            self.set_children(lambda_node, [V, body])
+            body = lambda_node
+        return body
+
+
+class CompactNode:
+    """A view of node i of a CompactAST, read like Standardizer.node.Node."""
+
+    __slots__ = ("ast", "i")
+
+    def __init__(self, ast, i):
+        self.ast = ast
+        self.i = i
+
+    def get_data(self):
+        return self.ast.get_data(self.i)
+
+    def get_children(self):
+        return [CompactNode(self.ast, child) for child in self.ast.get_children(self.i)]
+
+    def get_degree(self):
+        return len(self.ast.get_children(self.i))
+
+    @property
+    def position(self):
+        line = self.ast.line[self.i]
+        return (line, self.ast.column[self.i]) if line else None
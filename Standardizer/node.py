@@ -8,6 +8,8 @@ class Node:
         self.parent = None
         self.children = []
         self.is_standardized = False
+        # (line, column) in the source, for identifiers
+        self.position = None
 
     def set_data(self, data):
         """Set the data value for the node."""
@@ -278,6 +280,7 @@ class Node:
             
             # Create new structure
             F = NodeFactory.get_node_with_parent(X.get_data(), self.depth + 1, self, X.children, True)
+            F.position = X.position
             G = NodeFactory.create_gamma_node(self.depth + 1, self)
             Y = NodeFactory.get_node_with_parent("<Y*>", self.depth + 2, G, [], True)
             L = NodeFactory.create_lambda_node(self.depth + 2, G)
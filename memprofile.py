@@ -0,0 +1,80 @@
+"""Memory profile of the interpreter pipeline, for myrpal.py --memprofile.
+
+Each phase of the pipeline ends with a call to end_phase, which records the
+peak traced memory during the phase, the memory it retained (allocated and
+not freed by its end) and the source lines that retained the most. Execution
+is recorded in slices with sample, so the growth of the machine's state shows
+while the program runs.
+"""
+import linecache
+import sys
+import tracemalloc
+
+# Allocation sites reported per phase
+TOP_SITES = 5
+
+def format_size(size):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+class MemoryProfiler:
+    """Records peak and retained memory per phase with tracemalloc."""
+
+    # Allocations made by the profiler itself, and by the loading of modules
+    # a phase imports late (myrpal.py loads its own phases before starting),
+    # are not counted. This module is matched by the filename of its code,
+    # which differs from __file__ when running from the zipapp
+    FILTERS = (tracemalloc.Filter(False, tracemalloc.__file__),
+               tracemalloc.Filter(False, linecache.__file__),
+               tracemalloc.Filter(False, format_size.__code__.co_filename),
+               tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"))
+
+    def __init__(self, top=TOP_SITES):
+        self.top = top
+        self.phases = []  # (name, peak, retained, top sites)
+        self.snapshot = None
+        self.current = 0
+
+    def start(self):
+        tracemalloc.start()
+        self.snapshot = self.take_snapshot()
+        self.current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    def take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(self.FILTERS)
+
+    def end_phase(self, name, sites=True):
+        """Record the phase since the previous call, and start the next one."""
+        current, peak = tracemalloc.get_traced_memory()
+        top = []
+        if sites:
+            snapshot = self.take_snapshot()
+            top = [stat for stat in snapshot.compare_to(self.snapshot, "lineno") if stat.size_diff > 0][:self.top]
+            self.snapshot = snapshot
+        self.phases.append((name, peak, current - self.current, top))
+        self.current = current
+        tracemalloc.reset_peak()
+
+    def sample(self, name):
+        """Record a slice of execution, without allocation sites."""
+        self.end_phase(name, sites=False)
+
+    def stop(self):
+        tracemalloc.stop()
+
+    def report(self, stream=None):
+        stream = stream if stream is not None else sys.stderr
+        stream.write("Memory profile (peak is the most traced at once during the phase):\n")
+        stream.write(f"{'phase':<32} {'peak':>12} {'retained':>12}\n")
+        for name, peak, retained, top in self.phases:
+            sign = "+" if retained >= 0 else "-"
+            stream.write(f"{name:<32} {format_size(peak):>12} {sign + format_size(abs(retained)):>12}\n")
+            for stat in top:
+                frame = stat.traceback[0]
+                stream.write(f"    {frame.filename}:{frame.lineno}: +{format_size(stat.size_diff)} "
+                             f"in {stat.count_diff} blocks\n")
@@ -1,11 +1,30 @@
 import argparse
+import os
 import sys
 from contextlib import contextmanager
+from functools import partial
 from Parser.parser_1 import Parser
 from Lexical_Analyzer.lexical_analyzer import tokenize
-from Standardizer.ast_factory import ASTFactory
-from CSE_Machine.csemachine import CSEMachine
-from CSE_Machine.cse_factory import CSEMachineFactory
+from Standardizer.ast_dumper import FORMATS
+from CSE_Machine.output_buffer import OutputBuffer
+from CSE_Machine.defaults import DEFAULT_MEMO_SIZE, is_artifact
+
+# The modules of the later phases are imported where their phase runs, so
+# that short runs, and -ast and --check, do not pay for loading them. Only
+# argparse is loaded up front for every run: each mode is chosen from the
+# parsed options, so nothing can run before them, and parsing by hand would
+# duplicate the options, their help and their error messages
+
+# Machine steps between two memory samples of --memprofile
+MEMPROFILE_STEPS = 1000000
+
+# Modules of the later phases, loaded before --memprofile starts tracing so
+# that their loading is not charged to the phase that first uses them
+PHASE_MODULES = ("Standardizer.ast_factory", "Standardizer.compact_ast", "Optimizer.ast_optimizer",
+                 "Optimizer.inliner", "CSE_Machine.cse_factory", "CSE_Machine.standardizing_factory",
+                 "CSE_Machine.peephole", "CSE_Machine.memo_cache", "CSE_Machine.artifact",
+                 "CSE_Machine.checkpoint", "CSE_Machine.profiler", "CSE_Machine.parallel",
+                 "Closure_Engine.closure_compiler")
 
 @contextmanager
 def smart_open(filename=None, mode='r'):
@@ -24,18 +43,112 @@ class RPALProcessor:
     
     def __init__(self):
         self._setup_argument_parser()
+        self.memory_profiler = None
     
     def _setup_argument_parser(self):
         """Set up command line argument parser."""
         self.arg_parser = argparse.ArgumentParser(description='RPAL Language Processor')
-        self.arg_parser.add_argument('file_name', type=str, help='The RPAL program input file (use - for stdin)')
+        self.arg_parser.add_argument('file_name', type=str, nargs='*',
+                                     help='The RPAL program input file (use - for stdin); several files with --check')
+        self.arg_parser.add_argument('--check', action='store_true',
+                                     help='Only lex and parse each file, printing FILE:LINE:COLUMN: MESSAGE for the first error in each')
         self.arg_parser.add_argument('-ast', action='store_true', help='Print the abstract syntax tree')
         self.arg_parser.add_argument('-sast', action='store_true', help='Print the standardized abstract syntax tree')
+        self.arg_parser.add_argument('--format', choices=FORMATS, default='text',
+                                     help='Format of the -ast and -sast dumps: dotted text, or nested JSON')
+        self.arg_parser.add_argument('--compact-ast', action='store_true',
+                                     help='Build the tree in compact array columns, for large programs; skips optimization')
+        self.arg_parser.add_argument('--no-optimize', action='store_true', help='Skip inlining and constant folding on the standardized tree, '
+                                          'and superinstruction fusion on the control structures')
+        self.arg_parser.add_argument('--engine', choices=['cse', 'closure'], default='cse',
+                                     help='Execution backend: the CSE machine or closures compiled from the standardized tree')
+        self.arg_parser.add_argument('--compile', metavar='OUT',
+                                     help='Write the compiled control structures to OUT instead of running; run OUT with myrpal.py OUT')
+        self.arg_parser.add_argument('--memoize', action='store_true',
+                                     help='Cache the results of function applications on the CSE machine')
+        self.arg_parser.add_argument('--memo-size', type=int, default=DEFAULT_MEMO_SIZE, metavar='SIZE',
+                                     help=f'Entries kept by --memoize, least recently used out (default {DEFAULT_MEMO_SIZE})')
+        self.arg_parser.add_argument('--parallel', action='store_true',
+                                     help='Evaluate expensive tuple components in worker processes; no effect with '
+                                          '--checkpoint, --profile or --memprofile, which run the machine in slices')
+        self.arg_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, metavar='N',
+                                     help='Worker processes of --parallel (default: one per CPU)')
+        self.arg_parser.add_argument('--checkpoint', metavar='FILE',
+                                     help='Save the CSE machine state to FILE periodically; resume with --resume FILE')
+        self.arg_parser.add_argument('--resume', metavar='FILE',
+                                     help='Resume the CSE machine saved in FILE by --checkpoint. The file is unpickled, '
+                                          'which can run arbitrary code: only resume checkpoints you trust')
+        self.arg_parser.add_argument('--checkpoint-every', metavar='STEPS', type=int, default=1000000,
+                                     help='Machine steps between checkpoints (default 1000000)')
+        self.arg_parser.add_argument('--profile', metavar='FILE',
+                                     help='Profile the RPAL functions: print steps, calls and time per function on stderr '
+                                          'and write collapsed stacks for a flame graph to FILE')
+        self.arg_parser.add_argument('--memprofile', action='store_true',
+                                     help='Report the peak and retained memory and the top allocation sites of each phase on stderr')
         self.arg_parser.add_argument('-v', '--verbose', action='store_true', help='Enable verbose output')
     
     def process(self, cmd_args=None):
         """Process RPAL program according to command line arguments."""
         args = self.arg_parser.parse_args(cmd_args)
+        if args.check:
+            if not args.file_name:
+                self.arg_parser.error("--check needs at least one file")
+            return self._check_files(args.file_name)
+        if args.resume:
+            if args.file_name:
+                self.arg_parser.error("--resume takes no program file")
+            args.file_name = None
+        elif not args.file_name:
+            self.arg_parser.error("the following arguments are required: file_name")
+        elif len(args.file_name) > 1:
+            self.arg_parser.error("only --check takes more than one file")
+        else:
+            args.file_name = args.file_name[0]
+        if args.profile and args.engine != 'cse':
+            self.arg_parser.error("--profile needs the CSE machine engine")
+        if not args.memprofile:
+            return self._process(args)
+        
+        from importlib import import_module
+        from memprofile import MemoryProfiler
+        for name in PHASE_MODULES:
+            import_module(name)
+        self.memory_profiler = MemoryProfiler()
+        self.memory_profiler.start()
+        try:
+            return self._process(args)
+        finally:
+            self.memory_profiler.stop()
+            self.memory_profiler.report()
+            self.memory_profiler = None
+
+    def _process(self, args):
+        """Run, compile or dump the program in args.file_name."""
+        # A checkpoint resumes the machine right after the output it had written
+        if args.resume:
+            try:
+                if args.verbose:
+                    print("Resuming from checkpoint...")
+                from CSE_Machine.checkpoint import load_checkpoint
+                cse_machine = load_checkpoint(args.resume, output=OutputBuffer(sys.stdout))
+                self._end_phase("load checkpoint")
+                return self._run_cse_machine(cse_machine, args, resumed=True)
+            except Exception as e:
+                print(f"Error: {e}")
+                return 1
+        
+        # Compiled programs skip the front end entirely
+        if args.file_name != '-' and is_artifact(args.file_name):
+            try:
+                if args.verbose:
+                    print("Loading compiled program...")
+                from CSE_Machine.artifact import load_cse_machine
+                cse_machine = load_cse_machine(args.file_name, output=OutputBuffer(sys.stdout), memo=self._get_memo(args))
+                self._end_phase("load compiled program")
+                return self._run_cse_machine(cse_machine, args)
+            except Exception as e:
+                print(f"Error: {e}")
+                return 1
         
         # Read input with improved error handling
         try:
@@ -44,7 +157,7 @@ class RPALProcessor:
         except FileNotFoundError:
             print(f"Error: File '{args.file_name}' not found")
             return 1
-        except IOError as e:
+        except (IOError, UnicodeDecodeError) as e:
             print(f"Error reading file: {e}")
             return 1
             
@@ -53,48 +166,64 @@ class RPALProcessor:
             if args.verbose:
                 print("Tokenizing input...")
             tokens = tokenize(input_text)
+            self._end_phase("lex")
             
             if args.verbose:
                 print("Parsing tokens...")
-            parser = Parser(tokens)
+            if args.compact_ast:
+                from Standardizer.compact_ast import CompactAST
+            parser = Parser(tokens, ast=CompactAST() if args.compact_ast else None)
             ast_nodes = parser.parse()
+            self._end_phase("parse")
             if ast_nodes is None:
                 print("Error: Parsing failed")
                 return 1
+            
+            if args.compact_ast:
+                return self._run_compact_ast(ast_nodes, args)
                 
-            # Handle AST output
+            # Handle AST and SAST output
             if args.verbose:
-                print("Converting to string AST...")
+                print("Building AST...")
             string_ast = parser.convert_ast_to_string_ast()
-            if args.ast:
+            self._end_phase("string AST")
+            if args.ast and args.format == "text":
+                # The string AST is the dotted listing already
+                output = OutputBuffer(sys.stdout)
                 for string in string_ast:
-                    print(string)
+                    output.write(string + "\n")
+                output.flush()
                 return 0
-            
-            # Handle SAST output
-            if args.verbose:
-                print("Building and standardizing AST...")
+            from Standardizer.ast_factory import ASTFactory
             ast_factory = ASTFactory()
-            ast = ast_factory.get_abstract_syntax_tree(string_ast)
-            ast.standardize()
+            ast = ast_factory.get_abstract_syntax_tree(string_ast, parser.string_ast_positions)
+            self._end_phase("AST")
+            if args.ast:
+                ast.print_ast(args.format)
+                return 0
             if args.sast:
-                ast.print_ast()
+                ast.standardize()
+                self._end_phase("standardize")
+                ast.print_ast(args.format)
                 return 0
             
-            # Execute program
-            if args.verbose:
-                print("Building CSE machine...")
-            cse_machine_factory = CSEMachineFactory()
-            cse_machine = cse_machine_factory.get_cse_machine(ast)
-            
-            if args.verbose:
-                print("Executing program...")
-            result = cse_machine.get_answer()
+            # Optimize the standardized tree; without optimization the tree
+            # is standardized while the control structures are emitted
+            if not args.no_optimize:
+                if args.verbose:
+                    print("Standardizing AST...")
+                ast.standardize()
+                self._end_phase("standardize")
+                from Optimizer.ast_optimizer import ASTOptimizer
+                from Optimizer.inliner import Inliner
+                reduced = Inliner().inline(ast)
+                removed = ASTOptimizer().optimize(ast)
+                self._end_phase("optimize")
+                if args.verbose:
+                    print(f"Inliner removed {reduced} bindings")
+                    print(f"Optimizer removed {removed} nodes")
             
-            # Output result
-            print("Output of the RPAL program:")
-            print(result)
-            return 0
+            return self._run_ast(ast, args, standardized=not args.no_optimize)
             
         except Exception as e:
             print(f"Error: {e}")
@@ -103,6 +232,162 @@ class RPALProcessor:
                 traceback.print_exc()
             return 1
 
+    def _run_compact_ast(self, ast, args):
+        """Print or run a CompactAST built by the parser."""
+        if args.ast:
+            ast.print_ast(args.format)
+            return 0
+        if args.sast:
+            ast.standardize()
+            self._end_phase("standardize")
+            ast.print_ast(args.format)
+            return 0
+        # The optimizer rewrites Node trees, so a compact tree runs unoptimized
+        return self._run_ast(ast, args, standardized=False)
+
+    def _run_ast(self, ast, args, standardized):
+        """Compile, or run with the chosen engine, a tree.
+
+        A tree that is not standardized is standardized by the factory as it
+        emits the control structures, except for the closure engine.
+        """
+        if not standardized and args.engine == "closure":
+            ast.standardize()
+            self._end_phase("standardize")
+            standardized = True
+        if standardized:
+            from CSE_Machine.cse_factory import CSEMachineFactory as factory_class
+        else:
+            from CSE_Machine.standardizing_factory import StandardizingFactory as factory_class
+        
+        if args.compile:
+            from CSE_Machine.artifact import write_artifact
+            write_artifact(args.compile, ast, factory_class())
+            if args.verbose:
+                print(f"Compiled program written to {args.compile}")
+            return 0
+        
+        if args.engine == "closure":
+            return self._run_closure_engine(ast, args)
+        
+        # Execute program
+        if args.verbose:
+            print("Building CSE machine...")
+        cse_machine_factory = factory_class(parallel=args.parallel)
+        cse_machine = cse_machine_factory.get_cse_machine(ast, output=OutputBuffer(sys.stdout), memo=self._get_memo(args),
+                                                          workers=args.workers if args.parallel else 0)
+        if not args.no_optimize:
+            from CSE_Machine.peephole import Peephole
+            peephole = Peephole()
+            fused = peephole.optimize(cse_machine.control[-1])
+            if args.verbose:
+                print(f"Peephole fused {fused} runs of symbols: {peephole.counts}")
+        self._end_phase("build CSE machine")
+        return self._run_cse_machine(cse_machine, args)
+
+    def _check_files(self, file_names):
+        """Check the syntax of each file; return 1 if any has an error."""
+        from rpal import check
+        failed = 0
+        for file_name in file_names:
+            try:
+                with smart_open(file_name) as input_file:
+                    diagnostics = check(input_file.read())
+            except (IOError, UnicodeDecodeError) as e:
+                diagnostics = [(0, 0, f"Error reading file: {e}")]
+            for line, column, message in diagnostics:
+                print(f"{file_name}:{line}:{column}: {message}")
+            failed += bool(diagnostics)
+        if failed:
+            print(f"{failed} of {len(file_names)} files have errors", file=sys.stderr)
+        return 1 if failed else 0
+
+    def _run_cse_machine(self, cse_machine, args, resumed=False):
+        """Execute a CSE machine whose output is an OutputBuffer over stdout."""
+        if args.verbose:
+            print("Executing program...")
+        
+        # Output streams while the program runs; a program that never
+        # calls Print outputs the value it evaluates to
+        output = cse_machine.output
+        profiler = None
+        if args.profile:
+            from CSE_Machine.profiler import Profiler
+            profiler = Profiler()
+        run = partial(profiler.run, cse_machine) if profiler else cse_machine.run
+        if not resumed:
+            print("Output of the RPAL program:")
+        try:
+            if args.checkpoint or self.memory_profiler:
+                steps = args.checkpoint_every if args.checkpoint else MEMPROFILE_STEPS
+                if steps < 1:
+                    raise ValueError("--checkpoint-every needs a positive number of steps")
+                done = 0
+                while not run(steps):
+                    done += steps
+                    if args.checkpoint:
+                        from CSE_Machine.checkpoint import save_checkpoint
+                        save_checkpoint(cse_machine, args.checkpoint)
+                    self._end_phase(f"execute to step {done} ({len(cse_machine.environment)} environments)", sample=True)
+            else:
+                cse_machine.execute(profiler=profiler)
+            if not cse_machine.has_output:
+                cse_machine.render_value(cse_machine.stack[0], output.write)
+            output.write("\n")
+        finally:
+            output.flush()
+            if profiler is not None:
+                self._write_profile(profiler, args.profile)
+        self._end_phase(f"execute ({len(cse_machine.environment)} environments)")
+        if args.verbose and cse_machine.memo is not None:
+            print(f"Memo cache: {cse_machine.memo.get_stats()}")
+        if args.verbose and cse_machine.superinstruction_hits:
+            print(f"Superinstructions run: {cse_machine.superinstruction_hits}")
+        return 0
+
+    def _write_profile(self, profiler, file_name):
+        """Print the function table on stderr and write the collapsed stacks to file_name."""
+        profiler.finish()
+        profiler.write_report(sys.stderr.write)
+        with open(file_name, 'w') as file:
+            profiler.write_collapsed(file.write)
+
+    def _end_phase(self, name, sample=False):
+        """Mark the end of a pipeline phase for --memprofile."""
+        if self.memory_profiler is None:
+            return
+        if sample:
+            self.memory_profiler.sample(name)
+        else:
+            self.memory_profiler.end_phase(name)
+
+    def _get_memo(self, args):
+        """Return the cache for --memoize, or None."""
+        if not args.memoize:
+            return None
+        if args.memo_size < 1:
+            raise ValueError("--memo-size needs a positive cache size")
+        from CSE_Machine.memo_cache import MemoCache
+        return MemoCache(args.memo_size)
+
+    def _run_closure_engine(self, ast, args):
+        """Run the standardized tree with the closure-compiling backend."""
+        if args.verbose:
+            print("Compiling to closures and executing program...")
+        from Closure_Engine.closure_compiler import ClosureCompiler, write_value
+        output = OutputBuffer(sys.stdout)
+        compiler = ClosureCompiler(output=output)
+        print("Output of the RPAL program:")
+        try:
+            result = compiler.run(ast)
+            if not compiler.has_output:
+                write_value(result, output.write)
+            output.write("\n")
+        finally:
+            output.flush()
+        self._end_phase("compile to closures and execute")
+        return 0
+
 def main():
     """Entry point for the RPAL interpreter."""
     processor = RPALProcessor()
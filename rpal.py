@@ -0,0 +1,205 @@
+"""Library interface to the RPAL interpreter.
+
+    import rpal
+
+    program = rpal.compile("let f x = x * x in (f 3, 'four', f)")
+    value = program.run(limits=rpal.Limits(steps=10 ** 6, seconds=1.0))
+    # (9, 'four', <rpal.Function lambda closure: x: 1>)
+
+A Program holds control structures that no run modifies, so it can be run
+any number of times, each run on a fresh CSEMachine.
+"""
+import sys
+import time
+from Lexical_Analyzer.lexical_analyzer import tokenize
+from Parser.parser_1 import Parser, ParseError, NodeSink
+from Standardizer.ast_factory import ASTFactory
+from Optimizer.ast_optimizer import ASTOptimizer
+from Optimizer.inliner import Inliner
+from CSE_Machine.nodes import *
+from CSE_Machine.csemachine import CSEMachine
+from CSE_Machine.cse_factory import CSEMachineFactory
+from CSE_Machine.standardizing_factory import StandardizingFactory
+from CSE_Machine.peephole import Peephole
+
+# Machine steps between two checks of the time limit
+SLICE = 10000
+
+class RPALError(Exception):
+    """An RPAL program could not be compiled or run."""
+
+
+class RPALSyntaxError(RPALError):
+    """The source is not a valid RPAL program.
+
+    diagnostics lists (line, column, message) for each error found.
+    """
+
+    def __init__(self, diagnostics):
+        self.diagnostics = diagnostics
+        super().__init__("; ".join(f"{line}:{column}: {message}" for line, column, message in diagnostics))
+
+
+class LimitExceeded(RPALError):
+    """A run went past one of its Limits."""
+
+
+class Limits:
+    """Bounds on a run: machine steps and wall-clock seconds, None for no bound."""
+
+    def __init__(self, steps=None, seconds=None):
+        self.steps = steps
+        self.seconds = seconds
+
+
+class Function:
+    """An RPAL function returned by a run; it can be inspected, not called."""
+
+    def __init__(self, description):
+        self.description = description
+
+    def __repr__(self):
+        return f"<rpal.Function {self.description.strip('[]')}>"
+
+
+class Program:
+    """A compiled RPAL program."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def run(self, limits=None, output=None, builtins=None):
+        """Run the program and return its value as a native Python value.
+
+        Integers, strings and truth values become int, str and bool, tuples
+        become Python tuples (nil is ()), dummy becomes None and functions
+        become Function objects. Text printed by Print is written to output,
+        sys.stdout by default. builtins is a BuiltinRegistry to use instead
+        of the default one.
+        """
+        e0 = E(0)
+        machine = CSEMachine([e0, self.root], [e0], [e0], builtins, output if output is not None else sys.stdout)
+        steps = limits.steps if limits is not None else None
+        deadline = None
+        if limits is not None and limits.seconds is not None:
+            deadline = time.monotonic() + limits.seconds
+        try:
+            while True:
+                count = SLICE if steps is None else min(SLICE, steps)
+                if machine.run(count):
+                    break
+                if steps is not None:
+                    steps -= count
+                    if steps <= 0:
+                        raise LimitExceeded(f"Program ran for more than {limits.steps} steps")
+                if deadline is not None and time.monotonic() > deadline:
+                    raise LimitExceeded(f"Program ran for more than {limits.seconds} seconds")
+        except RPALError:
+            raise
+        except Exception as e:
+            raise RPALError(str(e)) from e
+        return to_native(machine, machine.stack[0])
+
+
+def compile(source, optimize=True):
+    """Compile RPAL source text into a Program; raise RPALSyntaxError if it is invalid."""
+    errors = []
+    tokens = tokenize(source, errors)
+    if errors:
+        raise RPALSyntaxError([(line, column, message) for _, line, column, message in errors])
+    parser = Parser(tokens, print_errors=False)
+    try:
+        parsed = parser.parse()
+    except IndexError:
+        parsed = None
+        parser.report_error("Parse error: unexpected end of input")
+    if parsed is None or parser.errors or not parser.ast:
+        raise RPALSyntaxError([get_diagnostic(source, token, message) for token, message in parser.errors] or
+                              [get_diagnostic(source, None, "Parse error: an expression was expected")])
+    ast = ASTFactory().get_abstract_syntax_tree(parser.convert_ast_to_string_ast(), parser.string_ast_positions)
+    if optimize:
+        ast.standardize()
+        Inliner().inline(ast)
+        ASTOptimizer().optimize(ast)
+        factory = CSEMachineFactory()
+    else:
+        factory = StandardizingFactory()
+    root = factory.get_delta(ast.get_root())
+    freeze(root)
+    if optimize:
+        Peephole().optimize(root)
+    return Program(root)
+
+def check(source):
+    """Lex and parse source without building a tree.
+
+    Returns [] if it is a valid program, otherwise [(line, column, message)]
+    for the first error.
+    """
+    errors = []
+    tokens = tokenize(source, errors)
+    if errors:
+        _, line, column, message = errors[0]
+        return [(line, column, message)]
+    parser = Parser(tokens, print_errors=False, ast=NodeSink(), stop_at_first_error=True)
+    try:
+        if not tokens:
+            raise ParseError("Parse error: an expression was expected", None)
+        parser.parse()
+    except ParseError as e:
+        return [get_diagnostic(source, e.token, str(e))]
+    except IndexError:
+        return [get_diagnostic(source, None, "Parse error: unexpected end of input")]
+    except RecursionError:
+        token = parser.tokens[0] if parser.tokens else None
+        return [get_diagnostic(source, token, "Parse error: expression nested too deeply")]
+    return []
+
+def get_diagnostic(source, token, message):
+    if token is None or token.get_line() is None:
+        # The end of the input
+        line = source.count("\n") + 1
+        return line, len(source) - (source.rfind("\n") + 1) + 1, message
+    return token.get_line(), token.get_column(), message
+
+def freeze(root):
+    # Runs only read the control structures, except for the values pushed
+    # from them: string views are materialized once here, and nil gets an
+    # immutable symbol list so that aug never appends to it in place
+    seen = set()
+    frozen = {}  # constants shared by several blocks are replaced once
+    pending = [root]
+    while pending:
+        block = pending.pop()
+        if id(block) in seen:
+            continue
+        seen.add(id(block))
+        symbols = block.symbols
+        for i, symbol in enumerate(symbols):
+            t = type(symbol)
+            if t is Str:
+                symbols[i] = frozen.setdefault(id(symbol), Str(symbol.get_data()))
+            elif t is Tup:
+                symbols[i] = frozen.setdefault(id(symbol), Tup(()))
+            elif t is Lambda:
+                pending.append(symbol.get_delta())
+            elif t is ParallelTau:
+                pending.extend(symbol.components)
+            elif t in (Delta, B):
+                pending.append(symbol)
+
+def to_native(machine, symbol):
+    t = type(symbol)
+    if t is Int:
+        return int(symbol.get_data())
+    elif t is Str:
+        return symbol.get_data()
+    elif t is Bool:
+        return symbol.get_data() == "true"
+    elif t is Dummy:
+        return None
+    elif t is Tup:
+        return tuple(to_native(machine, s) for s in symbol.get_symbols())
+    elif t in (Lambda, Eta, Builtin) or (t is Symbol and machine.builtins.get(symbol.get_data()) is not None):
+        return Function(machine.get_symbol_value(symbol))
+    return symbol.get_data()